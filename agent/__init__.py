@@ -4,13 +4,21 @@ agent 包
 包含 OCR Agent 和 LangGraph 工作流模块。
 """
 
-from .ocr_agent import OCRAgent, process_single_image, process_all_images
+from .ocr_agent import (
+    OCRAgent,
+    get_default_agent,
+    process_single_image,
+    process_all_images,
+    process_all_images_batch
+)
 from .graph import create_ocr_workflow, OCRState
 
 __all__ = [
     'OCRAgent',
+    'get_default_agent',
     'process_single_image',
     'process_all_images',
+    'process_all_images_batch',
     'create_ocr_workflow',
     'OCRState'
 ]
@@ -4,17 +4,111 @@ LangGraph 工作流模块
 定义 OCR Agent 的状态图和节点函数。
 """
 
-from typing import TypedDict, List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
+from dataclasses import dataclass, field
 from langgraph.graph import StateGraph, END
 import logging
 import json
 import re
+import httpx
+import orjson
+from openai import APIConnectionError, InternalServerError, RateLimitError
 
 from models import TOCEntry, ImageAnalysisResult, ValidationResult, ValidationStatus
 from config import load_prompt
 
 logger = logging.getLogger(__name__)
 
+# 可重试的临时性错误：限流、连接失败/超时、服务端 5xx。
+# 节点遇到这些错误时直接抛出，由 OCRAgent 的重试逻辑处理；其他错误记入 state.errors
+TRANSIENT_LLM_ERRORS = (
+    RateLimitError,
+    APIConnectionError,  # 包含 APITimeoutError
+    InternalServerError,
+    httpx.TransportError
+)
+
+# 预编译的正则表达式（每页、每次重试都会用到）
+_RE_ELLIPSIS = re.compile(r',?\s*\.{3,}\s*$')  # 末尾的省略号
+_RE_TRAILING_COMMA = re.compile(r',\s*(\]|\})')  # 闭括号前多余的逗号
+# JSON 字符串字面量（支持转义）与标量字面量（数字 / true / false / null）
+_RE_JSON_STRING = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"', re.DOTALL)
+_RE_JSON_SCALAR = re.compile(r'-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][+-]?\d+)?|true|false|null')
+# 括号扫描时需要关注的字符：引号及对应的一对括号
+_RE_BRACKET_TOKENS = {
+    '[': re.compile(r'["\[\]]'),
+    '{': re.compile(r'["{}]'),
+}
+
+# 用于快速定位合法 JSON 值的结尾
+_JSON_DECODER = json.JSONDecoder()
+
+# 目录条目的必需字段
+_REQUIRED_ENTRY_KEYS = frozenset(('title', 'page', 'level'))
+
+
+def _find_balanced(
+    s: str,
+    open_ch: str,
+    close_ch: str,
+    start: int = 0
+) -> Tuple[int, int]:
+    """
+    单遍扫描查找第一个括号平衡的片段
+    
+    从 start 开始查找第一个 open_ch，并跟踪嵌套深度，
+    跳过字符串字面量中的括号（正确处理 \\ 转义）。
+    
+    Args:
+        s: 待扫描的字符串
+        open_ch: 开括号（'[' 或 '{'）
+        close_ch: 对应的闭括号（']' 或 '}'）
+        start: 起始扫描位置
+        
+    Returns:
+        tuple: (起始位置, 结束位置)，结束位置为闭括号之后的下标；
+            找不到开括号时返回 (-1, -1)，未闭合（被截断）时返回 (起始位置, -1)
+    """
+    begin = s.find(open_ch, start)
+    if begin == -1:
+        return -1, -1
+    
+    # 常见情况下这一段本身就是合法 JSON，直接用标准库的 C 扫描器定位结尾
+    try:
+        return begin, _JSON_DECODER.raw_decode(s, begin)[1]
+    except (json.JSONDecodeError, RecursionError):
+        pass
+    
+    # 否则用正则在 C 层直接跳到下一个引号或括号，字符串字面量整体跳过，
+    # 避免在 Python 中逐字符循环
+    tokens = _RE_BRACKET_TOKENS[open_ch]
+    depth = 0
+    pos = begin
+    
+    while True:
+        match = tokens.search(s, pos)
+        if match is None:
+            return begin, -1
+        
+        i = match.start()
+        ch = s[i]
+        
+        if ch == '"':
+            string_match = _RE_JSON_STRING.match(s, i)
+            if string_match is None:
+                # 字符串未闭合（被截断）
+                return begin, -1
+            pos = string_match.end()
+            continue
+        
+        if ch == open_ch:
+            depth += 1
+        else:
+            depth -= 1
+            if depth == 0:
+                return begin, i + 1
+        pos = i + 1
+
 
 def extract_json_from_response(response: str) -> str:
     """
@@ -27,6 +121,8 @@ def extract_json_from_response(response: str) -> str:
     4. JSON 后有额外数据
     5. JSON 被截断（尝试修复）
     
+    只对响应做一次括号平衡扫描，取第一个完整的数组或对象。
+    
     Args:
         response: LLM 原始响应
         
@@ -35,45 +131,54 @@ def extract_json_from_response(response: str) -> str:
     """
     response = response.strip()
     
-    # 方法1: 尝试移除 markdown 代码块标记
-    # 查找 ```json 或 ``` 开头
-    if '```' in response:
-        # 找到第一个 ``` 的位置
-        start_marker = response.find('```')
-        if start_marker != -1:
-            # 跳过 ```json 或 ```
-            content_start = response.find('\n', start_marker) + 1
-            if content_start == 0:  # 没找到换行符
-                content_start = start_marker + 3
-                # 跳过可能的 'json'
-                if response[content_start:content_start+4] == 'json':
-                    content_start += 4
-            
-            # 找到结束的 ```
-            end_marker = response.find('```', content_start)
-            if end_marker != -1:
-                json_str = response[content_start:end_marker].strip()
-                if json_str.startswith('[') or json_str.startswith('{'):
-                    return clean_json_string(json_str)
-    
-    # 方法2: 查找 JSON 数组
-    array_start = response.find('[')
-    if array_start != -1:
-        array_end = response.rfind(']')
-        if array_end > array_start:
-            json_str = response[array_start:array_end+1]
-            return clean_json_string(json_str)
-    
-    # 方法3: 查找 JSON 对象
-    obj_start = response.find('{')
-    if obj_start != -1:
-        obj_end = response.rfind('}')
-        if obj_end > obj_start:
-            json_str = response[obj_start:obj_end+1]
-            return clean_json_string(json_str)
-    
-    # 如果都没找到，返回原始响应
-    return response
+    # 如果有 markdown 代码块，从代码块内容开始扫描（跳过 ```json 这一行）
+    scan_start = 0
+    fence_end = -1
+    fence_start = response.find('```')
+    if fence_start != -1:
+        line_end = response.find('\n', fence_start)
+        scan_start = line_end + 1 if line_end != -1 else fence_start + 3
+        fence_end = response.find('```', scan_start)
+    
+    # 取最先出现的开括号（数组或对象）
+    array_pos = response.find('[', scan_start)
+    obj_pos = response.find('{', scan_start)
+    if array_pos == -1 and obj_pos == -1:
+        # 如果都没找到，返回原始响应
+        return response
+    
+    if obj_pos == -1 or (array_pos != -1 and array_pos < obj_pos):
+        begin, end = _find_balanced(response, '[', ']', array_pos)
+    else:
+        begin, end = _find_balanced(response, '{', '}', obj_pos)
+    
+    if end == -1:
+        # 未闭合（输出被截断）：取到代码块结束或响应末尾，交给清理逻辑修复
+        end = fence_end if fence_end > begin else len(response)
+    
+    return clean_json_string(response[begin:end])
+
+
+def parse_json(response: str) -> Any:
+    """
+    解析 LLM 响应中的 JSON
+    
+    先直接解析整个响应（启用 JSON 模式后通常就是纯 JSON），
+    失败时再用 extract_json_from_response 提取并清理后解析。
+    
+    Args:
+        response: LLM 原始响应
+        
+    Returns:
+        Any: 解析后的数据
+        
+    Raises:
+        orjson.JSONDecodeError: 如果提取后的内容仍无法解析
+    """
+    try:
+        return orjson.loads(response.strip())
+    except orjson.JSONDecodeError:
+        return orjson.loads(extract_json_from_response(response))
 
 
 def clean_json_string(json_str: str) -> str:
@@ -94,13 +199,17 @@ def clean_json_string(json_str: str) -> str:
     json_str = json_str.strip()
     
     # 移除 ... 省略标记（如果在末尾）
-    json_str = re.sub(r',?\s*\.{3,}\s*$', '', json_str)
+    json_str = _RE_ELLIPSIS.sub('', json_str)
     
     # 移除尾部逗号（在 ] 或 } 前）
-    json_str = re.sub(r',\s*(\]|\})', r'\1', json_str)
+    json_str = _RE_TRAILING_COMMA.sub(r'\1', json_str)
+    
+    # 去掉省略号前残留的空白（无空白时不会复制字符串），首尾字符只取一次
+    json_str = json_str.rstrip()
+    first, last = json_str[:1], json_str[-1:]
     
     # 如果是数组但没有闭合
-    if json_str.startswith('[') and not json_str.rstrip().endswith(']'):
+    if first == '[' and last != ']':
         # 找到最后一个完整的对象
         last_brace = json_str.rfind('}')
         if last_brace > 0:
@@ -109,7 +218,7 @@ def clean_json_string(json_str: str) -> str:
             json_str += '\n]'
     
     # 如果是对象但没有闭合
-    if json_str.startswith('{') and not json_str.rstrip().endswith('}'):
+    elif first == '{' and last != '}':
         # 尝试找到最后一个完整字段
         last_brace = json_str.rfind('}')
         last_quote = json_str.rfind('"')
@@ -122,51 +231,301 @@ def clean_json_string(json_str: str) -> str:
     return json_str
 
 
-def attempt_fix_truncated_json(json_str: str) -> str:
+def parse_partial_json(json_str: str) -> Any:
     """
-    尝试修复被截断的 JSON 字符串
+    解析可能被截断的 JSON（自动补全未闭合的容器）
+    
+    按 JSON 词法单遍扫描，记录最后一个可以安全截断的位置以及
+    当时未闭合的容器栈，截断后按相反顺序补上 ] / }。
     
     处理以下情况：
-    1. 缺少闭合的 ]
-    2. 最后一个对象不完整
-    3. 额外的逗号
+    1. 缺少闭合的 ] 或 }（包括多层嵌套）
+    2. 最后一个条目不完整（数组中未完成的元素整体丢弃）
+    3. 末尾的逗号、... 省略标记或其他无法识别的内容
+    4. 完整 JSON 之后的额外数据
     
     Args:
         json_str: 可能被截断的 JSON 字符串
         
     Returns:
-        str: 修复后的 JSON 字符串
+        Any: 解析后的数据（list 或 dict）
+        
+    Raises:
+        orjson.JSONDecodeError: 如果找不到任何可恢复的内容
+        
+    Examples:
+        >>> parse_partial_json('[{"title":"a","page":1,"level":1},{"title":"b"')
+        [{'title': 'a', 'page': 1, 'level': 1}]
     """
-    json_str = json_str.strip()
+    s = json_str
+    n = len(s)
+    
+    # 定位第一个容器
+    array_pos = s.find('[')
+    obj_pos = s.find('{')
+    if array_pos == -1 and obj_pos == -1:
+        return orjson.loads(s)
+    begin = min(p for p in (array_pos, obj_pos) if p != -1)
+    
+    stack: List[str] = []  # 未闭合容器对应的闭括号
+    expect_key = False  # 当前是否位于对象中等待键名
+    cut, cut_stack = begin, ()  # 最后一个安全截断点
+    i = begin
+    
+    def can_cut() -> bool:
+        # 数组中的对象元素要么完整保留，要么整体丢弃
+        if ']' not in stack:
+            return True
+        return '}' not in stack[stack.index(']'):]
+    
+    while i < n:
+        ch = s[i]
+        
+        if ch in ' \t\r\n':
+            i += 1
+        elif ch == '[' or ch == '{':
+            stack.append(']' if ch == '[' else '}')
+            expect_key = ch == '{'
+            i += 1
+            if can_cut():
+                cut, cut_stack = i, tuple(stack)
+        elif ch == ']' or ch == '}':
+            if not stack or stack[-1] != ch:
+                break
+            stack.pop()
+            expect_key = False
+            i += 1
+            if not stack:
+                # 顶层值已完整，忽略后面的额外数据
+                cut, cut_stack = i, ()
+                break
+            if can_cut():
+                cut, cut_stack = i, tuple(stack)
+        elif ch == ',':
+            expect_key = stack[-1] == '}' if stack else False
+            i += 1
+        elif ch == ':':
+            expect_key = False
+            i += 1
+        elif ch == '"':
+            match = _RE_JSON_STRING.match(s, i)
+            if not match:
+                # 字符串未闭合
+                break
+            i = match.end()
+            if expect_key:
+                expect_key = False
+            elif can_cut():
+                cut, cut_stack = i, tuple(stack)
+        else:
+            match = _RE_JSON_SCALAR.match(s, i)
+            if not match or match.end() >= n:
+                # 无法识别的内容，或位于末尾可能不完整的数字
+                break
+            i = match.end()
+            if can_cut():
+                cut, cut_stack = i, tuple(stack)
+    
+    return orjson.loads(s[begin:cut] + ''.join(reversed(cut_stack)))
+
+
+def attempt_fix_truncated_json(json_str: str) -> str:
+    """
+    尝试修复被截断的 JSON 字符串
     
-    # 如果不是以 [ 开头，无法修复数组
-    if not json_str.startswith('['):
-        return json_str
+    基于 parse_partial_json 实现，返回补全后的 JSON 文本。
     
-    # 检查是否已经正确闭合
-    if json_str.endswith(']'):
+    Args:
+        json_str: 可能被截断的 JSON 字符串
+        
+    Returns:
+        str: 修复后的 JSON 字符串（无法修复时返回原字符串）
+    """
+    try:
+        return json.dumps(parse_partial_json(json_str), ensure_ascii=False)
+    except orjson.JSONDecodeError:
         return json_str
+
+
+class StreamingJsonParser:
+    """
+    增量 JSON 解析器
     
-    # 找到最后一个完整的对象 (以 } 结尾)
-    last_complete_brace = json_str.rfind('}')
+    逐段接收模型的流式输出，每当数组中的一个对象（即一个目录条目）
+    完整生成时立即解析并返回，无需等待整个响应结束。
+    已产出条目之前的文本会被丢弃，缓冲区只保留当前未完成的条目。
     
-    if last_complete_brace == -1:
-        # 没有找到任何完整对象
-        return json_str
+    Examples:
+        >>> parser = StreamingJsonParser()
+        >>> parser.feed('{"toc_entries": [{"title": "第一章", "pa')
+        []
+        >>> parser.feed('ge": 1, "level": 1}, {"title"')
+        [{'title': '第一章', 'page': 1, 'level': 1}]
+    """
     
-    # 截取到最后一个完整对象
-    fixed = json_str[:last_complete_brace + 1]
+    def __init__(self):
+        self._buffer = ''
+        self._pos = 0
+        self._stack: List[str] = []  # 未闭合的开括号
+        self._in_string = False
+        self._escape = False
+        self._entry_start: Optional[int] = None  # 当前条目在缓冲区中的起始位置
+        self._entry_depth = 0
+        self.done = False  # 顶层值是否已完整
+    
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """
+        输入一段文本，返回其中新完成的条目
+        
+        Args:
+            chunk: 流式输出的文本片段
+            
+        Returns:
+            List[Dict]: 本次新完成的目录条目（可能为空）
+        """
+        entries = []
+        if self.done:
+            return entries
+        
+        buffer = self._buffer + chunk
+        stack = self._stack
+        i = self._pos
+        n = len(buffer)
+        
+        while i < n:
+            ch = buffer[i]
+            
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif not stack and ch not in '[{':
+                # 顶层值之前的文本（如 ```json 标记）直接跳过
+                pass
+            elif ch == '"':
+                self._in_string = True
+            elif ch == '[' or ch == '{':
+                if ch == '{' and self._entry_start is None and stack and stack[-1] == '[':
+                    self._entry_start = i
+                    self._entry_depth = len(stack)
+                stack.append(ch)
+            elif ch == ']' or ch == '}':
+                if stack:
+                    stack.pop()
+                if self._entry_start is not None and len(stack) == self._entry_depth:
+                    try:
+                        entries.append(orjson.loads(buffer[self._entry_start:i + 1]))
+                    except orjson.JSONDecodeError as e:
+                        logger.warning(f"[StreamingJsonParser] 跳过无法解析的条目: {e}")
+                    self._entry_start = None
+                if not stack:
+                    self.done = True
+                    break
+            i += 1
+        
+        # 丢弃已处理且不再需要的文本
+        if self._entry_start is None:
+            self._buffer, self._pos = '', 0
+        else:
+            self._buffer = buffer[self._entry_start:]
+            self._pos = i - self._entry_start
+            self._entry_start = 0
+        
+        return entries
+
+
+class _EntryValidator:
+    """
+    目录条目验证器
     
-    # 移除末尾可能的逗号
-    fixed = re.sub(r',\s*$', '', fixed)
+    逐条验证并修正目录条目，既可用于批量验证，
+    也可在流式识别过程中每完成一个条目就立即验证。
+    """
     
-    # 添加闭合的 ]
-    fixed += '\n]'
+    def __init__(self):
+        self.fixed_data: List[Dict[str, Any]] = []
+        self.warnings: List[str] = []
+        self.errors: List[str] = []
+        self.count = 0
     
-    return fixed
+    def add(self, entry: Dict[str, Any]) -> None:
+        """
+        验证并修正一个条目
+        
+        Args:
+            entry: 目录条目
+        """
+        self.count += 1
+        i = self.count - 1
+        warnings = self.warnings
+        
+        # 验证必需字段
+        if not _REQUIRED_ENTRY_KEYS.issubset(entry):
+            self.errors.append(f"条目 {i+1} 缺少必需字段")
+            return
+        
+        # 清理和修正
+        title = entry['title'].strip()
+        page = entry['page']
+        level = entry['level']
+        
+        # 修正页码
+        if page == 0:
+            page = 1
+            warnings.append(f"条目 {i+1}: 页码从 0 修正为 1")
+        
+        # 修正层级
+        if level < 1:
+            level = 1
+            warnings.append(f"条目 {i+1}: 层级从 {entry['level']} 修正为 1")
+        elif level > 5:
+            level = 5
+            warnings.append(f"条目 {i+1}: 层级从 {entry['level']} 修正为 5")
+        
+        self.fixed_data.append({
+            'title': title,
+            'page': page,
+            'level': level
+        })
+    
+    def apply(self, state: 'OCRState') -> str:
+        """
+        将验证结果写入状态
+        
+        Args:
+            state: 当前状态
+            
+        Returns:
+            str: 验证状态
+        """
+        # 确定验证状态
+        if self.errors:
+            status = 'invalid'
+        elif self.warnings:
+            status = 'valid_with_fixes'
+        else:
+            status = 'valid'
+        
+        state.validation_result = {
+            'status': status,
+            'data': self.fixed_data,
+            'warnings': self.warnings,
+            'errors': self.errors
+        }
+        
+        # 更新 structured_data 为修正后的数据
+        if status != 'invalid':
+            state.structured_data = self.fixed_data
+        
+        state.metadata['validation_completed'] = True
+        return status
 
 
-class OCRState(TypedDict):
+@dataclass(slots=True)
+class OCRState:
     """
     OCR Agent 的状态定义
     
@@ -174,7 +533,7 @@ class OCRState(TypedDict):
     
     Attributes:
         image_path: 图片文件路径
-        raw_text: 提取的原始文本
+        raw_text: LLM 原始响应文本
         structured_data: 结构化的目录项列表
         analysis_result: 图片分析结果
         validation_result: 数据验证结果
@@ -182,197 +541,165 @@ class OCRState(TypedDict):
         metadata: 元数据（如置信度、耗时等）
     """
     image_path: str
-    raw_text: Optional[str]
-    structured_data: Optional[List[Dict[str, Any]]]
-    analysis_result: Optional[Dict[str, Any]]
-    validation_result: Optional[Dict[str, Any]]
-    errors: List[str]
-    metadata: Dict[str, Any]
+    raw_text: Optional[str] = None
+    structured_data: Optional[List[Dict[str, Any]]] = None
+    analysis_result: Optional[Dict[str, Any]] = None
+    validation_result: Optional[Dict[str, Any]] = None
+    errors: List[str] = field(default_factory=list)
+    metadata: Dict[str, Any] = field(default_factory=dict)
 
 
-def analyze_image_node(state: OCRState, llm_client) -> OCRState:
+def _toc_entries_from_result(result: Any) -> List[Dict[str, Any]]:
     """
-    节点：分析图片
+    从合并调用的响应中取出目录条目列表
     
-    分析目录页图片的质量和布局特征。
+    兼容 {"analysis": {...}, "toc_entries": [...]} 对象，
+    以及模型直接输出的条目数组。
     
     Args:
-        state: 当前状态
-        llm_client: LLM 客户端（由 graph 传入）
+        result: 解析后的 JSON 数据
         
     Returns:
-        OCRState: 更新后的状态
-    """
-    logger.info(f"[analyze_image] 开始分析图片: {state['image_path']}")
-    
-    try:
-        # 加载 Prompt
-        prompt = load_prompt('analyze_image')
+        list: 目录条目字典列表
         
-        # 调用 LLM（需要传入图片）
-        # 这里是伪代码，实际需要根据 LLM 客户端的 API 调整
-        response = llm_client.analyze_image(
-            image_path=state['image_path'],
-            prompt=prompt
-        )
-        
-        # 提取并解析 JSON
-        json_str = extract_json_from_response(response)
-        analysis_result = json.loads(json_str)
-        
-        state['analysis_result'] = analysis_result
-        state['metadata']['analysis_completed'] = True
-        
-        logger.info(
-            f"[analyze_image] 完成 - 质量: {analysis_result.get('quality')}, "
-            f"布局: {analysis_result.get('layout')}"
-        )
+    Raises:
+        ValueError: 如果响应中没有条目数组
+    """
+    if isinstance(result, list):
+        return result
     
-    except Exception as e:
-        error_msg = f"图片分析失败: {e}"
-        logger.error(f"[analyze_image] {error_msg}")
-        state['errors'].append(error_msg)
+    if isinstance(result, dict) and isinstance(result.get('toc_entries'), list):
+        return result['toc_entries']
     
-    return state
+    raise ValueError("响应中缺少 toc_entries 数组")
 
 
-def extract_text_node(state: OCRState, llm_client) -> OCRState:
+def apply_toc_response(
+    state: OCRState,
+    response: str,
+    validator: Optional[_EntryValidator] = None
+) -> OCRState:
     """
-    节点：提取文本
+    解析模型响应并写入状态
     
-    使用 LLM 的视觉能力提取图片中的所有文本。
+    解析 {"analysis": {...}, "toc_entries": [...]} 格式的响应，
+    JSON 不完整时尝试按截断 JSON 恢复。
     
     Args:
         state: 当前状态
-        llm_client: LLM 客户端
+        response: LLM 原始响应文本
+        validator: 流式过程中已逐条验证的验证器（可选，条目一致时直接采用其结果）
         
     Returns:
         OCRState: 更新后的状态
     """
-    logger.info(f"[extract_text] 开始提取文本")
+    # 保留原始响应，便于排查识别问题
+    state.raw_text = response
     
     try:
-        # 加载 Prompt
-        prompt = load_prompt('extract_text')
+        # 解析 JSON
+        result = parse_json(response)
         
-        # 调用 LLM
-        response = llm_client.extract_text(
-            image_path=state['image_path'],
-            prompt=prompt
-        )
+        if isinstance(result, dict) and isinstance(result.get('analysis'), dict):
+            analysis_result = result['analysis']
+            state.analysis_result = analysis_result
+            state.metadata['analysis_completed'] = True
+            
+            logger.info(
+                f"[analyze_and_extract] 分析完成 - 质量: {analysis_result.get('quality')}, "
+                f"布局: {analysis_result.get('layout')}"
+            )
         
-        state['raw_text'] = response.strip()
-        state['metadata']['text_extracted'] = True
+        structured_data = _toc_entries_from_result(result)
+        
+        state.structured_data = structured_data
+        state.metadata['structure_parsed'] = True
+        
+        logger.info(f"[analyze_and_extract] 完成 - 识别到 {len(structured_data)} 个条目")
+        
+        # 流式解析的条目与完整解析一致时，直接采用已完成的验证结果
+        if validator is not None and structured_data and validator.count == len(structured_data):
+            validator.apply(state)
+    
+    except orjson.JSONDecodeError as e:
+        error_msg = f"JSON 解析失败: {e}"
+        logger.error(f"[analyze_and_extract] {error_msg}")
+        
+        # 记录原始响应和提取的 JSON
+        json_str = extract_json_from_response(response)
+        logger.error(f"[analyze_and_extract] 原始响应前500字符: {response[:500]}...")
+        logger.error(f"[analyze_and_extract] 提取的JSON前500字符: {json_str[:500]}...")
+        logger.error(f"[analyze_and_extract] 提取的JSON后100字符: ...{json_str[-100:]}")
+        
+        # 尝试按截断 JSON 恢复（同时处理 Extra data 与未闭合的嵌套结构）
+        try:
+            structured_data = _toc_entries_from_result(parse_partial_json(json_str))
+            
+            if len(structured_data) > 0:
+                state.structured_data = structured_data
+                state.metadata['structure_parsed'] = True
+                logger.info(f"[analyze_and_extract] 修复成功 - 识别到 {len(structured_data)} 个条目")
+                return state
+        except Exception as fix_error:
+            logger.error(f"[analyze_and_extract] JSON 修复失败: {fix_error}")
         
-        logger.info(f"[extract_text] 完成 - 文本长度: {len(state['raw_text'])}")
+        state.errors.append(error_msg)
     
     except Exception as e:
-        error_msg = f"文本提取失败: {e}"
-        logger.error(f"[extract_text] {error_msg}")
-        state['errors'].append(error_msg)
+        error_msg = f"目录识别失败: {e}"
+        logger.error(f"[analyze_and_extract] {error_msg}")
+        state.errors.append(error_msg)
     
     return state
 
 
-def parse_structure_node(state: OCRState, llm_client) -> OCRState:
+async def analyze_and_extract_node(state: OCRState, llm_client) -> OCRState:
     """
-    节点：解析结构
+    节点：分析图片并提取目录
     
-    将原始文本解析为结构化的目录数据。
+    一次视觉调用同时完成图片分析和目录结构化，直接输出
+    {"analysis": {...}, "toc_entries": [...]}，每页只需一次请求往返。
     
     Args:
         state: 当前状态
-        llm_client: LLM 客户端
+        llm_client: LLM 客户端（由 graph 传入）
         
     Returns:
         OCRState: 更新后的状态
     """
-    logger.info(f"[parse_structure] 开始解析结构")
-    
-    if not state.get('raw_text'):
-        error_msg = "没有可解析的文本"
-        logger.error(f"[parse_structure] {error_msg}")
-        state['errors'].append(error_msg)
-        return state
+    logger.info(f"[analyze_and_extract] 开始识别图片: {state.image_path}")
     
     try:
         # 加载 Prompt
-        prompt_template = load_prompt('parse_structure')
-        prompt = prompt_template.replace('{raw_text}', state['raw_text'])
-        
-        # 调用 LLM
-        response = llm_client.complete(prompt=prompt)
-        
-        # 提取并解析 JSON
-        json_str = extract_json_from_response(response)
-        structured_data = json.loads(json_str)
-        
-        # 验证数据格式
-        if not isinstance(structured_data, list):
-            raise ValueError("响应不是数组格式")
-        
-        state['structured_data'] = structured_data
-        state['metadata']['structure_parsed'] = True
+        prompt = load_prompt('analyze_and_extract')
         
-        logger.info(f"[parse_structure] 完成 - 识别到 {len(structured_data)} 个条目")
-    
-    except json.JSONDecodeError as e:
-        error_msg = f"JSON 解析失败: {e}"
-        logger.error(f"[parse_structure] {error_msg}")
+        # 流式调用 LLM（需要传入图片，要求输出 JSON 对象），
+        # 每完成一个条目就立即验证，与模型解码过程重叠
+        parser = StreamingJsonParser()
+        validator = _EntryValidator()
+        chunks = []
         
-        # 记录原始响应和提取的 JSON
-        if 'response' in locals():
-            logger.error(f"[parse_structure] 原始响应前500字符: {response[:500]}...")
-        if 'json_str' in locals():
-            logger.error(f"[parse_structure] 提取的JSON前500字符: {json_str[:500]}...")
-            logger.error(f"[parse_structure] 提取的JSON后100字符: ...{json_str[-100:]}")
-            
-            # 尝试修复
-            try:
-                # 如果是 "Extra data" 错误，说明 JSON 前面部分是有效的
-                # 尝试只解析到错误位置
-                if "Extra data" in str(e):
-                    # 从错误信息中提取位置
-                    import re
-                    match = re.search(r'char (\d+)', str(e))
-                    if match:
-                        error_pos = int(match.group(1))
-                        # 截取到错误位置之前
-                        truncated = json_str[:error_pos]
-                        logger.info(f"[parse_structure] 检测到 Extra data，尝试截取前 {error_pos} 个字符...")
-                        
-                        # 尝试修复截断的部分
-                        fixed_json = attempt_fix_truncated_json(truncated)
-                        structured_data = json.loads(fixed_json)
-                        
-                        if isinstance(structured_data, list) and len(structured_data) > 0:
-                            state['structured_data'] = structured_data
-                            state['metadata']['structure_parsed'] = True
-                            logger.info(f"[parse_structure] 修复成功 - 识别到 {len(structured_data)} 个条目")
-                            return state
-                else:
-                    # 其他类型的 JSON 错误，尝试一般性修复
-                    fixed_json = attempt_fix_truncated_json(json_str)
-                    if fixed_json != json_str:
-                        logger.info(f"[parse_structure] 尝试修复截断的 JSON...")
-                        structured_data = json.loads(fixed_json)
-                        
-                        if isinstance(structured_data, list) and len(structured_data) > 0:
-                            state['structured_data'] = structured_data
-                            state['metadata']['structure_parsed'] = True
-                            logger.info(f"[parse_structure] 修复成功 - 识别到 {len(structured_data)} 个条目")
-                            return state
-            except Exception as fix_error:
-                logger.error(f"[parse_structure] JSON 修复失败: {fix_error}")
-        
-        state['errors'].append(error_msg)
+        async for chunk in llm_client.a_stream_image(
+            image_path=state.image_path,
+            prompt=prompt,
+            image_data_url=state.metadata.get('image_data_url'),
+            json_mode=True
+        ):
+            chunks.append(chunk)
+            for entry in parser.feed(chunk):
+                validator.add(entry)
+    
+    except TRANSIENT_LLM_ERRORS:
+        # 临时性错误交给上层重试（限流使用更长的等待时间）
+        raise
     
     except Exception as e:
-        error_msg = f"结构解析失败: {e}"
-        logger.error(f"[parse_structure] {error_msg}")
-        state['errors'].append(error_msg)
+        error_msg = f"目录识别失败: {e}"
+        logger.error(f"[analyze_and_extract] {error_msg}")
+        state.errors.append(error_msg)
+        return state
     
-    return state
+    return apply_toc_response(state, ''.join(chunks), validator)
 
 
 def validate_data_node(state: OCRState, llm_client) -> OCRState:
@@ -388,12 +715,16 @@ def validate_data_node(state: OCRState, llm_client) -> OCRState:
     Returns:
         OCRState: 更新后的状态
     """
+    if state.metadata.get('validation_completed'):
+        logger.info(f"[validate_data] 已在流式识别过程中完成验证，跳过")
+        return state
+    
     logger.info(f"[validate_data] 开始验证数据")
     
-    if not state.get('structured_data'):
+    if not state.structured_data:
         error_msg = "没有可验证的数据"
         logger.error(f"[validate_data] {error_msg}")
-        state['errors'].append(error_msg)
+        state.errors.append(error_msg)
         return state
     
     try:
@@ -401,60 +732,12 @@ def validate_data_node(state: OCRState, llm_client) -> OCRState:
         # 因为 schema 文件的 $ref 引用可能无法解析
         
         # 逻辑验证
-        warnings = []
-        errors = []
-        fixed_data = []
-        
-        for i, entry in enumerate(state['structured_data']):
-            # 验证必需字段
-            if not all(k in entry for k in ['title', 'page', 'level']):
-                errors.append(f"条目 {i+1} 缺少必需字段")
-                continue
-            
-            # 清理和修正
-            title = entry['title'].strip()
-            page = entry['page']
-            level = entry['level']
-            
-            # 修正页码
-            if page == 0:
-                page = 1
-                warnings.append(f"条目 {i+1}: 页码从 0 修正为 1")
-            
-            # 修正层级
-            if level < 1:
-                level = 1
-                warnings.append(f"条目 {i+1}: 层级从 {entry['level']} 修正为 1")
-            elif level > 5:
-                level = 5
-                warnings.append(f"条目 {i+1}: 层级从 {entry['level']} 修正为 5")
-            
-            fixed_data.append({
-                'title': title,
-                'page': page,
-                'level': level
-            })
+        validator = _EntryValidator()
+        for entry in state.structured_data:
+            validator.add(entry)
         
-        # 确定验证状态
-        if errors:
-            status = 'invalid'
-        elif warnings:
-            status = 'valid_with_fixes'
-        else:
-            status = 'valid'
-        
-        state['validation_result'] = {
-            'status': status,
-            'data': fixed_data,
-            'warnings': warnings,
-            'errors': errors
-        }
-        
-        # 更新 structured_data 为修正后的数据
-        if status != 'invalid':
-            state['structured_data'] = fixed_data
-        
-        state['metadata']['validation_completed'] = True
+        status = validator.apply(state)
+        warnings, errors = validator.warnings, validator.errors
         
         logger.info(
             f"[validate_data] 完成 - 状态: {status}, "
@@ -464,7 +747,7 @@ def validate_data_node(state: OCRState, llm_client) -> OCRState:
     except Exception as e:
         error_msg = f"数据验证失败: {e}"
         logger.error(f"[validate_data] {error_msg}")
-        state['errors'].append(error_msg)
+        state.errors.append(error_msg)
     
     return state
 
@@ -485,34 +768,25 @@ def create_ocr_workflow(llm_client) -> StateGraph:
         >>> from agent.ocr_agent import get_llm_client
         >>> client = get_llm_client()
         >>> workflow = create_ocr_workflow(client)
-        >>> result = workflow.invoke(initial_state)
+        >>> result = await workflow.ainvoke(initial_state)
     """
     # 创建状态图
     workflow = StateGraph(OCRState)
     
     # 添加节点（使用闭包绑定 llm_client）
-    workflow.add_node(
-        "analyze_image",
-        lambda state: analyze_image_node(state, llm_client)
-    )
-    workflow.add_node(
-        "extract_text",
-        lambda state: extract_text_node(state, llm_client)
-    )
-    workflow.add_node(
-        "parse_structure",
-        lambda state: parse_structure_node(state, llm_client)
-    )
+    # 调用 LLM 的节点为异步函数，需通过 ainvoke 执行工作流
+    async def _analyze_and_extract(state: OCRState) -> OCRState:
+        return await analyze_and_extract_node(state, llm_client)
+    
+    workflow.add_node("analyze_and_extract", _analyze_and_extract)
     workflow.add_node(
         "validate_data",
         lambda state: validate_data_node(state, llm_client)
     )
     
     # 设置边（定义执行顺序）
-    workflow.set_entry_point("analyze_image")
-    workflow.add_edge("analyze_image", "extract_text")
-    workflow.add_edge("extract_text", "parse_structure")
-    workflow.add_edge("parse_structure", "validate_data")
+    workflow.set_entry_point("analyze_and_extract")
+    workflow.add_edge("analyze_and_extract", "validate_data")
     workflow.add_edge("validate_data", END)
     
     # 编译工作流
@@ -523,27 +797,27 @@ def create_ocr_workflow(llm_client) -> StateGraph:
     return compiled_workflow
 
 
-def create_initial_state(image_path: str) -> OCRState:
+def create_initial_state(
+    image_path: str,
+    image_data_url: Optional[str] = None
+) -> OCRState:
     """
     创建初始状态
     
     Args:
         image_path: 图片文件路径
+        image_data_url: 预先编码好的图片 data URL（可选，
+            提供后各视觉节点直接复用，不再重复读取和编码图片）
         
     Returns:
-        OCRState: 初始状态字典
+        OCRState: 初始状态
     """
-    return {
-        'image_path': image_path,
-        'raw_text': None,
-        'structured_data': None,
-        'analysis_result': None,
-        'validation_result': None,
-        'errors': [],
-        'metadata': {
+    return OCRState(
+        image_path=image_path,
+        metadata={
             'analysis_completed': False,
-            'text_extracted': False,
             'structure_parsed': False,
-            'validation_completed': False
+            'validation_completed': False,
+            'image_data_url': image_data_url
         }
-    }
+    )
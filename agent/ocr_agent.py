@@ -5,23 +5,123 @@ OCR Agent 模块
 """
 
 import asyncio
+import concurrent.futures
+import dataclasses
+import functools
+import os
+from operator import attrgetter
 from pathlib import Path
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, AsyncIterator, Tuple
 import logging
 import time
-import base64
+import pybase64
+import io
+import json
 import httpx
+import orjson
+from PIL import Image
+from tqdm.asyncio import tqdm
 
 from langchain_openai import ChatOpenAI
+from openai import OpenAI, RateLimitError
+from tenacity import (
+    AsyncRetrying,
+    RetryCallState,
+    retry_if_exception_type,
+    stop_after_attempt,
+    wait_exponential_jitter
+)
 from langchain_core.messages import HumanMessage
 
 from models import TOCPage, TOCEntry
-from config import get_config
-from .graph import create_ocr_workflow, create_initial_state, OCRState
+from config import get_config, load_prompt
+from .graph import (
+    create_ocr_workflow,
+    create_initial_state,
+    apply_toc_response,
+    validate_data_node,
+    OCRState,
+    TRANSIENT_LLM_ERRORS
+)
 
 logger = logging.getLogger(__name__)
 
 
+@functools.lru_cache(maxsize=32)
+def _encode_image_cached(
+    image_path: str,
+    mtime_ns: int,
+    max_edge: int,
+    quality: int
+) -> Tuple[str, str]:
+    """
+    读取、缩放并编码图片（按路径、修改时间和目标尺寸缓存）
+    
+    视觉模型识别文字只需要约 1024 像素的长边，扫描页原图往往有
+    2000-4000 像素，缩放（Lanczos）后再编码可大幅减少上传数据量。
+    黑白二值 / 调色板图片（线稿）保存为 PNG，其余保存为 JPEG。
+    
+    Args:
+        image_path: 图片文件路径
+        mtime_ns: 文件修改时间（纳秒），文件被覆盖后缓存自动失效
+        max_edge: 最长边上限（像素），0 表示不缩放
+        quality: JPEG 质量（1-100）
+        
+    Returns:
+        tuple: (MIME 类型, base64 编码的图片数据)
+    """
+    with Image.open(image_path) as img:
+        if max_edge > 0 and max(img.size) > max_edge:
+            img.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+        
+        buffer = io.BytesIO()
+        if img.mode in ('1', 'P'):
+            img.save(buffer, format='PNG', optimize=True)
+            mime_type = 'image/png'
+        else:
+            if img.mode not in ('RGB', 'L'):
+                img = img.convert('RGB')
+            img.save(buffer, format='JPEG', quality=quality)
+            mime_type = 'image/jpeg'
+    
+    return mime_type, pybase64.b64encode(buffer.getvalue()).decode('ascii')
+
+
+def encode_image_once(
+    image_path: str,
+    max_edge: int = 1024,
+    quality: int = 90
+) -> Tuple[str, str]:
+    """
+    将图片缩放并编码为 base64（同一文件只读取和编码一次）
+    
+    同一页图片会在多个节点和重试中被重复发送，
+    缓存可避免重复的磁盘读取、缩放和 base64 编码。
+    
+    Args:
+        image_path: 图片文件路径
+        max_edge: 最长边上限（像素），0 表示不缩放
+        quality: JPEG 质量（1-100）
+        
+    Returns:
+        tuple: (MIME 类型, base64 编码的图片数据)
+    """
+    return _encode_image_cached(
+        image_path,
+        os.stat(image_path).st_mtime_ns,
+        max_edge,
+        quality
+    )
+
+
+class _FailedResult(Exception):
+    """工作流执行完成但结果无效（出现错误或没有数据），需要重试"""
+    
+    def __init__(self, result: OCRState):
+        super().__init__("工作流结果无效")
+        self.result = result
+
+
 class LLMClient:
     """
     LLM 客户端封装
@@ -31,6 +131,7 @@ class LLMClient:
     Attributes:
         model: ChatOpenAI 实例
         config: API 配置
+        max_concurrent_requests: 同时进行的 LLM 请求上限
     """
     
     def __init__(self):
@@ -41,23 +142,178 @@ class LLMClient:
         # 因此不需要手动配置代理，只需确保 .env 文件中配置了正确的代理即可
         if config.api.http_proxy or config.api.https_proxy:
             # 设置环境变量以便 httpx 自动使用
-            import os
             if config.api.http_proxy:
                 os.environ['HTTP_PROXY'] = config.api.http_proxy
             if config.api.https_proxy:
                 os.environ['HTTPS_PROXY'] = config.api.https_proxy
             logger.info(f"已配置代理环境变量: HTTP_PROXY={config.api.http_proxy}, HTTPS_PROXY={config.api.https_proxy}")
         
+        self.config = config.api
+        self._proxy_url = config.api.https_proxy or config.api.http_proxy
+        
+        # 模型实例与其异步 HTTP 客户端绑定到事件循环，见 _get_semaphore
+        self._build_models(http_async_client=None)
+        
+        # 所有 LLM 调用共享的并发闸门，避免触发 OpenRouter 的速率限制（429）
+        self.max_concurrent_requests = config.ocr.max_concurrent_requests
+        self._sem: Optional[asyncio.Semaphore] = None
+        self._sem_loop: Optional[asyncio.AbstractEventLoop] = None
+        # 切换事件循环时遗留的旧客户端的关闭任务（保留引用，避免任务被回收）
+        self._close_tasks: set = set()
+        
+        # 图片编码专用线程池（首次使用时创建，aclose() 时关闭），见 _get_executor
+        self._executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+        
+        # 上传前的图片缩放参数
+        self.upload_max_edge = config.ocr.upload_max_edge
+        self.upload_quality = config.ocr.upload_quality
+        
+        logger.info(
+            f"LLM 客户端已初始化: {config.api.model_name} "
+            f"(最大并发请求: {self.max_concurrent_requests})"
+        )
+    
+    def _build_models(self, http_async_client: Optional[httpx.AsyncClient]) -> None:
+        """
+        创建模型实例
+        
+        Args:
+            http_async_client: 异步请求使用的 HTTP 客户端（None 表示仅用于同步调用）
+        """
+        self.http_async_client = http_async_client
         self.model = ChatOpenAI(
-            base_url=config.api.base_url,
-            api_key=config.api.api_key,  # type: ignore
-            model=config.api.model_name,
-            temperature=config.api.temperature,
-            timeout=config.api.timeout,
+            base_url=self.config.base_url,
+            api_key=self.config.api_key,  # type: ignore
+            model=self.config.model_name,
+            temperature=self.config.temperature,
+            timeout=self.config.timeout,
+            http_async_client=http_async_client,
         )
+        # JSON 模式：要求模型直接输出 JSON 对象，便于可靠解析
+        self.json_model = self.model.bind(response_format={"type": "json_object"})
+    
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        """
+        获取当前事件循环对应的并发信号量
         
-        self.config = config.api
-        logger.info(f"LLM 客户端已初始化: {config.api.model_name}")
+        asyncio.Semaphore 和 httpx.AsyncClient 的连接都会绑定到所在的事件循环，
+        因此每个事件循环使用独立的信号量，并创建一个共享的异步 HTTP 客户端
+        （连接池 + HTTP/2 keep-alive）。连接复用只在同一个事件循环内成立：
+        同一批次内所有页面复用同一批连接，换用新的事件循环时会重新建立客户端。
+        应通过 run() 启动事件循环，退出前会关闭该循环内创建的客户端；
+        若旧客户端未被关闭（如调用方自行使用 asyncio.run），则在新循环中补充关闭。
+        
+        Returns:
+            asyncio.Semaphore: 并发信号量
+        """
+        loop = asyncio.get_running_loop()
+        if self._sem is None or self._sem_loop is not loop:
+            stale_client = self.http_async_client
+            if stale_client is not None:
+                task = loop.create_task(self._aclose_client(stale_client))
+                self._close_tasks.add(task)
+                task.add_done_callback(self._close_tasks.discard)
+            self._sem = asyncio.Semaphore(self.max_concurrent_requests)
+            self._sem_loop = loop
+            self._build_models(httpx.AsyncClient(
+                http2=True,
+                limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+                proxy=self._proxy_url,
+                timeout=self.config.timeout
+            ))
+        return self._sem
+    
+    @staticmethod
+    async def _aclose_client(client: httpx.AsyncClient) -> None:
+        """
+        关闭异步 HTTP 客户端
+        
+        旧事件循环已关闭时，其连接无法正常断开，这里只记录调试日志。
+        
+        Args:
+            client: 要关闭的客户端
+        """
+        try:
+            await client.aclose()
+        except Exception as e:
+            logger.debug(f"关闭旧的 HTTP 客户端失败: {e}")
+    
+    def _get_executor(self) -> concurrent.futures.ThreadPoolExecutor:
+        """
+        获取图片编码专用线程池（首次使用或关闭后重新创建）
+        
+        线程数与并发上限一致；默认执行器的 min(32, cpu_count + 4) 个线程对这里的负载过多。
+        
+        Returns:
+            ThreadPoolExecutor: 线程池
+        """
+        if self._executor is None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.max_concurrent_requests,
+                thread_name_prefix='ocr'
+            )
+        return self._executor
+    
+    async def aclose(self) -> None:
+        """
+        关闭当前事件循环中创建的异步 HTTP 客户端和图片编码线程池
+        
+        关闭后模型恢复为仅用于同步调用的实例，下次异步调用时会重新创建客户端和线程池。
+        """
+        executor = self._executor
+        if executor is not None:
+            self._executor = None
+            # 编码任务通常已全部完成；若仍有进行中的任务（如出错提前退出），等待其结束
+            executor.shutdown(wait=True)
+        
+        client = self.http_async_client
+        if client is None:
+            return
+        self._sem = None
+        self._sem_loop = None
+        self._build_models(http_async_client=None)
+        await self._aclose_client(client)
+    
+    def run(self, coro: Any) -> Any:
+        """
+        在新的事件循环中运行协程（asyncio.run 的封装）
+        
+        协程结束后（包括抛出异常时）在同一个事件循环中关闭异步 HTTP 客户端和线程池，
+        避免每次同步调用都遗留一个绑定在已关闭循环上的连接池。
+        
+        Args:
+            coro: 要运行的协程
+            
+        Returns:
+            Any: 协程的返回值
+        """
+        async def runner():
+            try:
+                return await coro
+            finally:
+                await self.aclose()
+        
+        return asyncio.run(runner())
+    
+    async def astream(self, messages: List[Any], json_mode: bool = False) -> AsyncIterator[str]:
+        """
+        流式调用模型（受并发上限约束）
+        
+        模型每生成一段文本就立即产出，调用方可以边接收边解析。
+        
+        Args:
+            messages: 消息列表
+            json_mode: 是否要求模型输出 JSON 对象
+            
+        Yields:
+            str: 响应文本片段
+        """
+        async with self._get_semaphore():
+            model = self.json_model if json_mode else self.model
+            async for chunk in model.astream(messages):
+                content = chunk.content
+                if content:
+                    yield content if isinstance(content, str) else str(content)
     
     def encode_image(self, image_path: str) -> str:
         """
@@ -69,75 +325,137 @@ class LLMClient:
         Returns:
             str: base64 编码的图片数据
         """
-        with open(image_path, "rb") as image_file:
-            return base64.b64encode(image_file.read()).decode('utf-8')
+        return self._encode(image_path)[1]
+    
+    def _encode(self, image_path: str) -> Tuple[str, str]:
+        """按配置的上传尺寸和质量编码图片，返回 (MIME 类型, base64 数据)"""
+        return encode_image_once(
+            image_path,
+            max_edge=self.upload_max_edge,
+            quality=self.upload_quality
+        )
     
-    def analyze_image(self, image_path: str, prompt: str) -> str:
+    def image_data_url(self, image_path: str) -> str:
         """
-        分析图片（视觉理解）
+        生成图片的 data URL
         
         Args:
             image_path: 图片文件路径
-            prompt: 提示词
             
         Returns:
-            str: LLM 响应文本
+            str: data URL（可直接用于 image_url 消息）
         """
-        logger.info(f"[LLM] 分析图片: {image_path}")
+        mime_type, data = self._encode(image_path)
+        return f"data:{mime_type};base64,{data}"
+    
+    async def a_image_data_url(self, image_path: str) -> str:
+        """
+        生成图片的 data URL（异步版本）
+        
+        磁盘读取、缩放和编码在专用线程池中执行，不阻塞事件循环，
+        使其与其他页面进行中的 LLM 请求重叠。
+        
+        Args:
+            image_path: 图片文件路径
+            
+        Returns:
+            str: data URL（可直接用于 image_url 消息）
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_executor(), self.image_data_url, image_path)
+    
+    def _build_image_message(
+        self,
+        image_path: str,
+        prompt: str,
+        image_data_url: Optional[str] = None
+    ) -> HumanMessage:
+        """
+        构建包含图片的消息
         
-        # 编码图片
-        image_base64 = self.encode_image(image_path)
+        Args:
+            image_path: 图片文件路径
+            prompt: 提示词
+            image_data_url: 预先编码好的图片 data URL（可选，提供时跳过编码）
+            
+        Returns:
+            HumanMessage: 多模态消息
+        """
+        if image_data_url is None:
+            image_data_url = self.image_data_url(image_path)
         
-        # 构建消息
-        message = HumanMessage(
+        return HumanMessage(
             content=[
                 {"type": "text", "text": prompt},
                 {
                     "type": "image_url",
-                    "image_url": {"url": f"data:image/png;base64,{image_base64}"}
+                    "image_url": {"url": image_data_url}
                 }
             ]
         )
-        
-        # 调用模型
-        response = self.model.invoke([message])
-        content = response.content
-        return content if isinstance(content, str) else str(content)
     
-    def extract_text(self, image_path: str, prompt: str) -> str:
+    def analyze_image(
+        self,
+        image_path: str,
+        prompt: str,
+        image_data_url: Optional[str] = None
+    ) -> str:
         """
-        提取图片中的文本
+        分析图片（视觉理解）
         
         Args:
             image_path: 图片文件路径
             prompt: 提示词
+            image_data_url: 预先编码好的图片 data URL（可选）
             
         Returns:
-            str: 提取的文本
+            str: LLM 响应文本
         """
-        logger.info(f"[LLM] 提取文本")
-        return self.analyze_image(image_path, prompt)
+        logger.info(f"[LLM] 分析图片: {image_path}")
+        
+        message = self._build_image_message(image_path, prompt, image_data_url)
+        
+        # 调用模型
+        response = self.model.invoke([message])
+        content = response.content
+        return content if isinstance(content, str) else str(content)
     
-    def complete(self, prompt: str) -> str:
+    async def a_stream_image(
+        self,
+        image_path: str,
+        prompt: str,
+        image_data_url: Optional[str] = None,
+        json_mode: bool = False
+    ) -> AsyncIterator[str]:
         """
-        文本补全（不需要图片）
+        分析图片（流式版本）
         
         Args:
+            image_path: 图片文件路径
             prompt: 提示词
+            image_data_url: 预先编码好的图片 data URL（可选）
+            json_mode: 是否要求模型输出 JSON 对象
             
-        Returns:
-            str: LLM 响应文本
+        Yields:
+            str: 响应文本片段
         """
-        logger.info(f"[LLM] 文本补全")
+        logger.info(f"[LLM] 流式分析图片: {image_path}")
         
-        message = HumanMessage(content=prompt)
-        response = self.model.invoke([message])
-        return str(response.content)
+        message = self._build_image_message(image_path, prompt, image_data_url)
+        
+        async for chunk in self.astream([message], json_mode=json_mode):
+            yield chunk
 
 
+@functools.lru_cache(maxsize=1)
 def get_llm_client() -> LLMClient:
     """
-    获取 LLM 客户端实例
+    获取 LLM 客户端实例（进程内单例）
+    
+    所有页面共享同一个客户端，避免每页重复建立连接和 TLS 握手。
+    客户端内部的所有异步请求共享一个并发上限，默认 5，
+    可通过环境变量 OCR_MAX_CONCURRENT_REQUESTS 调整
+    （免费或低配额的 API Key 建议调低，以避免 429 限流）。
     
     Returns:
         LLMClient: LLM 客户端
@@ -176,7 +494,27 @@ class OCRAgent:
         retry: bool = True
     ) -> OCRState:
         """
-        处理单张图片
+        处理单张图片（同步封装）
+        
+        Args:
+            image_path: 图片文件路径
+            retry: 是否启用重试机制
+            
+        Returns:
+            OCRState: 处理结果状态
+            
+        Raises:
+            FileNotFoundError: 如果图片文件不存在
+        """
+        return self.llm_client.run(self.aprocess_image(image_path, retry))
+    
+    async def aprocess_image(
+        self,
+        image_path: str,
+        retry: bool = True
+    ) -> OCRState:
+        """
+        处理单张图片（异步）
         
         Args:
             image_path: 图片文件路径
@@ -196,31 +534,57 @@ class OCRAgent:
         logger.info(f"开始处理图片: {image_path}")
         start_time = time.time()
         
-        # 创建初始状态
-        initial_state = create_initial_state(image_path)
+        # 创建初始状态（图片只编码一次，供各节点及重试复用）
+        initial_state = create_initial_state(
+            image_path,
+            image_data_url=await self.llm_client.a_image_data_url(image_path)
+        )
         
         # 执行工作流
         if retry:
-            result = self._process_with_retry(initial_state)
+            result = await self._process_with_retry(initial_state)
         else:
-            result = self.workflow.invoke(initial_state)  # type: ignore
+            result = await self._run_workflow(initial_state)
         
         elapsed_time = time.time() - start_time
-        result['metadata']['elapsed_time'] = elapsed_time
+        result.metadata['elapsed_time'] = elapsed_time
         
-        structured_data = result.get('structured_data', [])
+        structured_data = result.structured_data
         data_count = len(structured_data) if structured_data else 0
         logger.info(
             f"处理完成 - 耗时: {elapsed_time:.2f}s, "
             f"识别: {data_count} 个条目"
         )
         
-        return result  # type: ignore
+        return result
+    
+    async def _run_workflow(self, initial_state: OCRState) -> OCRState:
+        """
+        执行一次工作流
+        
+        每次执行都复制可变字段，避免重试时沿用上一次的错误和元数据。
+        
+        Args:
+            initial_state: 初始状态
+            
+        Returns:
+            OCRState: 处理结果
+        """
+        state = dataclasses.replace(
+            initial_state,
+            errors=[],
+            metadata=dict(initial_state.metadata)
+        )
+        result = await self.workflow.ainvoke(state)
+        return OCRState(**result)
     
-    def _process_with_retry(self, initial_state: OCRState) -> OCRState:
+    async def _process_with_retry(self, initial_state: OCRState) -> OCRState:
         """
         带重试机制的处理
         
+        使用非阻塞的指数退避（带随机抖动）重试，等待期间事件循环
+        可以继续处理其他页面；限流（429）使用更长的等待时间。
+        
         Args:
             initial_state: 初始状态
             
@@ -229,37 +593,41 @@ class OCRAgent:
         """
         max_retries = self.config.max_retries
         retry_delay = self.config.retry_delay
-        result: OCRState = initial_state  # 初始化
         
-        for attempt in range(max_retries):
-            try:
-                result = self.workflow.invoke(initial_state)  # type: ignore
-                
-                # 检查是否成功
-                if (result.get('structured_data') and 
-                    not result.get('errors')):
-                    return result
-                
-                # 如果有错误但不是最后一次尝试，重试
-                if attempt < max_retries - 1:
-                    logger.warning(
-                        f"处理失败，{retry_delay}秒后重试 "
-                        f"({attempt + 1}/{max_retries})"
-                    )
-                    time.sleep(retry_delay)
-                    # 指数退避
-                    retry_delay *= 2
-                else:
-                    logger.error(f"处理失败，已达最大重试次数")
-                    return result
-            
-            except Exception as e:
-                logger.error(f"处理异常: {e}")
-                if attempt < max_retries - 1:
-                    time.sleep(retry_delay)
-                    retry_delay *= 2
-                else:
-                    raise
+        normal_wait = wait_exponential_jitter(initial=retry_delay, max=60)
+        rate_limit_wait = wait_exponential_jitter(initial=max(retry_delay * 5, 10), max=120)
+        
+        def wait(retry_state: RetryCallState) -> float:
+            if isinstance(retry_state.outcome.exception(), RateLimitError):
+                return rate_limit_wait(retry_state)
+            return normal_wait(retry_state)
+        
+        def before_sleep(retry_state: RetryCallState) -> None:
+            exc = retry_state.outcome.exception()
+            reason = "处理失败" if isinstance(exc, _FailedResult) else f"处理异常: {exc}"
+            logger.warning(
+                f"{reason}，{retry_state.next_action.sleep:.1f}秒后重试 "
+                f"({retry_state.attempt_number}/{max_retries})"
+            )
+        
+        try:
+            async for attempt in AsyncRetrying(
+                stop=stop_after_attempt(max_retries),
+                wait=wait,
+                retry=retry_if_exception_type((_FailedResult, *TRANSIENT_LLM_ERRORS)),
+                before_sleep=before_sleep,
+                reraise=True
+            ):
+                with attempt:
+                    result = await self._run_workflow(initial_state)
+                    
+                    # 没有识别到数据或出现错误时视为失败，触发重试
+                    if not result.structured_data or result.errors:
+                        raise _FailedResult(result)
+        
+        except _FailedResult as e:
+            logger.error(f"处理失败，已达最大重试次数")
+            return e.result
         
         return result
     
@@ -270,7 +638,28 @@ class OCRAgent:
         save_json: bool = True
     ) -> TOCPage:
         """
-        处理图片并转换为 TOCPage 对象
+        处理图片并转换为 TOCPage 对象（同步封装）
+        
+        Args:
+            image_path: 图片文件路径
+            page_number: 页码
+            save_json: 是否保存为 JSON 文件
+            
+        Returns:
+            TOCPage: 单页目录对象
+        """
+        return self.llm_client.run(
+            self.aprocess_image_to_toc_page(image_path, page_number, save_json)
+        )
+    
+    async def aprocess_image_to_toc_page(
+        self,
+        image_path: str,
+        page_number: int,
+        save_json: bool = True
+    ) -> TOCPage:
+        """
+        处理图片并转换为 TOCPage 对象（异步）
         
         Args:
             image_path: 图片文件路径
@@ -281,11 +670,32 @@ class OCRAgent:
             TOCPage: 单页目录对象
         """
         # 处理图片
-        result = self.process_image(image_path)
+        result = await self.aprocess_image(image_path)
         
+        return self._build_toc_page(result, image_path, page_number, save_json)
+    
+    def _build_toc_page(
+        self,
+        result: OCRState,
+        image_path: str,
+        page_number: int,
+        save_json: bool = True
+    ) -> TOCPage:
+        """
+        将工作流结果转换为 TOCPage 对象
+        
+        Args:
+            result: 工作流处理结果
+            image_path: 图片文件路径
+            page_number: 页码
+            save_json: 是否保存为 JSON 文件
+            
+        Returns:
+            TOCPage: 单页目录对象
+        """
         # 转换为 TOCEntry 对象
         entries = []
-        structured_data = result.get('structured_data')
+        structured_data = result.structured_data
         
         if structured_data and isinstance(structured_data, list):
             for entry_data in structured_data:
@@ -308,12 +718,25 @@ class OCRAgent:
         if save_json:
             config = get_config()
             json_path = config.paths.toc_json_dir / f"page_{page_number}.json"
-            toc_page.save_to_file(str(json_path))
-            logger.info(f"✓ 已保存: {json_path}")
+            if toc_page.save_to_file_fast(str(json_path)):
+                logger.info(f"✓ 已保存: {json_path}")
+            else:
+                logger.info(f"✓ 内容未变化，跳过写入: {json_path}")
         
         return toc_page
 
 
+@functools.lru_cache(maxsize=1)
+def get_default_agent() -> OCRAgent:
+    """
+    获取默认的 OCR Agent（进程内单例，复用已编译的工作流和 LLM 客户端）
+    
+    Returns:
+        OCRAgent: OCR Agent 实例
+    """
+    return OCRAgent()
+
+
 def process_single_image(
     image_path: str,
     page_number: int,
@@ -331,7 +754,7 @@ def process_single_image(
         TOCPage: 单页目录对象
     """
     if agent is None:
-        agent = OCRAgent()
+        agent = get_default_agent()
     
     return agent.process_image_to_toc_page(image_path, page_number)
 
@@ -339,7 +762,8 @@ def process_single_image(
 def process_all_images(
     image_paths: List[str],
     start_page_number: int = 1,
-    parallel: bool = False
+    parallel: bool = False,
+    agent: Optional[OCRAgent] = None
 ) -> List[TOCPage]:
     """
     批量处理多张图片
@@ -348,26 +772,30 @@ def process_all_images(
         image_paths: 图片文件路径列表
         start_page_number: 起始页码
         parallel: 是否并行处理（默认顺序处理）
+        agent: OCR Agent 实例（可选，默认使用进程内共享的实例）
         
     Returns:
         list: TOCPage 对象列表
     """
-    agent = OCRAgent()
+    if agent is None:
+        agent = get_default_agent()
     
+    # 整本书离线识别：通过 Batch API 一次性提交
+    if agent.config.use_batch_api:
+        return process_all_images_batch(image_paths, start_page_number, agent)
+    
+    # 两种模式都在同一个事件循环中运行，保证异步 HTTP 客户端可以复用连接
     if parallel:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            return loop.run_until_complete(
-                _process_images_parallel(agent, image_paths, start_page_number)
-            )
-        finally:
-            loop.close()
+        return agent.llm_client.run(
+            _process_images_parallel(agent, image_paths, start_page_number)
+        )
     else:
-        return _process_images_sequential(agent, image_paths, start_page_number)
+        return agent.llm_client.run(
+            _process_images_sequential(agent, image_paths, start_page_number)
+        )
 
 
-def _process_images_sequential(
+async def _process_images_sequential(
     agent: OCRAgent,
     image_paths: List[str],
     start_page_number: int
@@ -392,7 +820,7 @@ def _process_images_sequential(
         logger.info(f"处理进度: {i}/{total} - 页 {page_number}")
         
         try:
-            toc_page = agent.process_image_to_toc_page(
+            toc_page = await agent.aprocess_image_to_toc_page(
                 image_path=image_path,
                 page_number=page_number
             )
@@ -414,19 +842,23 @@ async def _process_images_parallel(
     """
     并行处理图片
     
+    所有页面在同一个事件循环中并发发起非阻塞请求，
+    实际的并发请求数由 LLMClient 内部的信号量（OCRConfig.max_concurrent_requests）限制，
+    重试等待期间不占用并发名额。每页完成后立即更新进度条，不必等待最慢的页面。
+    
     Args:
         agent: OCR Agent 实例
         image_paths: 图片路径列表
         start_page_number: 起始页码
         
     Returns:
-        list: TOCPage 对象列表
+        list: TOCPage 对象列表（按页码排序）
     """
     async def process_one(image_path: str, page_number: int):
         """异步处理单张图片"""
         try:
-            return await asyncio.to_thread(
-                agent.process_image_to_toc_page,
+            logger.info(f"正在处理第 {page_number} 页...")
+            return await agent.aprocess_image_to_toc_page(
                 image_path,
                 page_number
             )
@@ -440,7 +872,134 @@ async def _process_images_parallel(
         for i, image_path in enumerate(image_paths)
     ]
     
-    # 并行执行
-    results = await asyncio.gather(*tasks)
+    # 并行执行，按完成顺序更新进度条
+    results = []
+    for future in tqdm.as_completed(tasks, total=len(tasks), desc="OCR 识别", unit="页"):
+        result = await future
+        logger.info(f"第 {result.page_number} 页完成 ({len(result.entries)} 个条目)")
+        results.append(result)
+    
+    results.sort(key=attrgetter('page_number'))
+    return results
+
+
+def process_all_images_batch(
+    image_paths: List[str],
+    start_page_number: int = 1,
+    agent: Optional[OCRAgent] = None
+) -> List[TOCPage]:
+    """
+    通过 Batch API 批量处理多张图片
+    
+    将所有页面打包为一个 JSONL 文件上传并创建 Batch 任务，
+    轮询直到任务结束后下载结果，再按与工作流相同的逻辑解析和验证。
+    Batch API 的费用约为实时请求的一半，且不占用实时请求的速率配额，
+    适合对延迟不敏感的整本书处理。需要 API 提供方支持 /v1/batches（如 OpenAI）。
+    
+    Args:
+        image_paths: 图片文件路径列表
+        start_page_number: 起始页码
+        agent: OCR Agent 实例（可选）
+        
+    Returns:
+        list: TOCPage 对象列表（与 image_paths 顺序一致）
+        
+    Raises:
+        RuntimeError: 如果 Batch 任务未能成功完成
+        TimeoutError: 如果任务在 OCRConfig.batch_timeout 内未结束（任务会被取消）
+    """
+    config = get_config()
+    if agent is None:
+        agent = get_default_agent()
+    llm_client = agent.llm_client
+    
+    # 1. 生成批量请求文件（每页一行）
+    prompt = load_prompt('analyze_and_extract')
+    batch_path = config.paths.temp_dir / 'batch_requests.jsonl'
+    batch_path.parent.mkdir(parents=True, exist_ok=True)
+    
+    with open(batch_path, 'w', encoding='utf-8') as f:
+        for i, image_path in enumerate(image_paths):
+            message = llm_client._build_image_message(image_path, prompt)
+            # 与实时请求相同，不设置 max_tokens，避免长目录的输出被截断
+            request = {
+                "custom_id": f"page_{i}",
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": config.api.model_name,
+                    "temperature": config.api.temperature,
+                    "response_format": {"type": "json_object"},
+                    "messages": [{"role": "user", "content": message.content}]
+                }
+            }
+            f.write(json.dumps(request, ensure_ascii=False) + '\n')
+    
+    logger.info(f"[Batch] 已生成批量请求文件: {batch_path} ({len(image_paths)} 页)")
+    
+    # 2. 上传文件并创建 Batch 任务（客户端及其连接池在退出时关闭）
+    proxy_url = config.api.https_proxy or config.api.http_proxy
+    with OpenAI(
+        base_url=config.api.base_url,
+        api_key=config.api.api_key,
+        http_client=httpx.Client(proxy=proxy_url, timeout=config.api.timeout)
+    ) as client:
+        with open(batch_path, 'rb') as f:
+            batch_file = client.files.create(file=f, purpose="batch")
+        
+        batch = client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h"
+        )
+        logger.info(f"[Batch] 已创建任务: {batch.id}")
+        
+        # 3. 轮询任务状态（超时或用户中断时取消任务，避免继续计费）
+        deadline = time.monotonic() + agent.config.batch_timeout
+        try:
+            while batch.status not in ('completed', 'failed', 'expired', 'cancelled'):
+                if time.monotonic() >= deadline:
+                    raise TimeoutError(
+                        f"Batch 任务超时未完成: {batch.id} ({batch.status})"
+                    )
+                time.sleep(agent.config.batch_poll_interval)
+                batch = client.batches.retrieve(batch.id)
+                logger.info(f"[Batch] 任务状态: {batch.status}")
+        except (KeyboardInterrupt, TimeoutError):
+            logger.warning(f"[Batch] 正在取消任务: {batch.id}")
+            try:
+                client.batches.cancel(batch.id)
+            except Exception as e:
+                logger.error(f"[Batch] 取消任务失败 ({batch.id}): {e}")
+            raise
+        
+        if batch.status != 'completed' or not batch.output_file_id:
+            raise RuntimeError(f"Batch 任务未完成: {batch.id} ({batch.status})")
+        
+        # 4. 下载结果
+        output_text = client.files.content(batch.output_file_id).text
+    
+    responses: Dict[str, str] = {}
+    for line in output_text.splitlines():
+        if not line.strip():
+            continue
+        item = orjson.loads(line)
+        response = item.get('response') or {}
+        if item.get('error') or response.get('status_code') != 200:
+            logger.error(f"[Batch] 请求失败 ({item.get('custom_id')}): {item.get('error') or response}")
+            continue
+        responses[item['custom_id']] = response['body']['choices'][0]['message']['content'] or ''
+    
+    # 5. 解析并验证每一页
+    results = []
+    for i, image_path in enumerate(image_paths):
+        page_number = start_page_number + i
+        state = create_initial_state(image_path)
+        
+        content = responses.get(f"page_{i}")
+        if content is not None:
+            state = validate_data_node(apply_toc_response(state, content), llm_client)
+        
+        results.append(agent._build_toc_page(state, image_path, page_number))
     
     return results
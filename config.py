@@ -4,18 +4,76 @@
 负责加载和管理项目配置，包括环境变量、API 配置、路径配置等。
 """
 
+import functools
 import os
+import shutil
 from pathlib import Path
-from typing import Optional
+from types import MappingProxyType
+from typing import Any, Mapping, Optional
 from dataclasses import dataclass
-from dotenv import load_dotenv
 
+import orjson
 
-# 加载 .env 文件
-load_dotenv()
 
+# 项目根目录（config.py 所在目录），导入时解析一次
+_PROJECT_ROOT: Path = Path(__file__).resolve().parent
 
-@dataclass
+
+def _load_env(path: Path) -> None:
+    """
+    读取 .env 文件并写入环境变量（已存在的环境变量不会被覆盖）
+    
+    只支持简单的 KEY=VALUE 格式：忽略空行和 # 注释行，
+    允许 export 前缀，引号值取配对引号之间的内容（其后可跟 # 注释），
+    未加引号的值支持行尾 # 注释。
+    
+    Args:
+        path: .env 文件路径
+    """
+    if not path.is_file():
+        return
+    
+    for raw_line in path.read_bytes().decode('utf-8-sig').splitlines():
+        line = raw_line.strip()
+        if not line or line.startswith('#') or '=' not in line:
+            continue
+        
+        key, value = line.split('=', 1)
+        key = key.strip()
+        if key.startswith('export '):
+            key = key[len('export '):].strip()
+        value = value.strip()
+        
+        if value[:1] in ('"', "'"):
+            # 引号值取到配对的闭合引号为止，其后的内容（如 # 注释）一律忽略
+            closing = value.find(value[0], 1)
+            if closing != -1:
+                value = value[1:closing]
+        elif ' #' in value:
+            value = value.split(' #', 1)[0].rstrip()
+        
+        os.environ.setdefault(key, value)
+
+
+def _as_int(env: Mapping[str, str], key: str, default: int) -> int:
+    """读取整数类型的环境变量"""
+    value = env.get(key)
+    return default if value is None else int(value)
+
+
+def _as_float(env: Mapping[str, str], key: str, default: float) -> float:
+    """读取浮点数类型的环境变量"""
+    value = env.get(key)
+    return default if value is None else float(value)
+
+
+def _as_bool(env: Mapping[str, str], key: str, default: bool) -> bool:
+    """读取布尔类型的环境变量（1 / true / yes 视为真）"""
+    value = env.get(key)
+    return default if value is None else value.lower() in ('1', 'true', 'yes')
+
+
+@dataclass(slots=True, frozen=True)
 class APIConfig:
     """
     API 配置类
@@ -42,19 +100,25 @@ class APIConfig:
     https_proxy: Optional[str] = None
     
     @classmethod
-    def from_env(cls) -> 'APIConfig':
+    def from_env(cls, env: Optional[Mapping[str, str]] = None) -> 'APIConfig':
         """
         从环境变量加载 API 配置
         
+        Args:
+            env: 环境变量快照（可选，默认读取 os.environ）
+        
         Returns:
             APIConfig: API 配置实例
             
         Raises:
             ValueError: 如果必需的环境变量缺失
         """
-        base_url = os.getenv('API_BASE_URL')
-        api_key = os.getenv('API_KEY')
-        model_name = os.getenv('MODEL_NAME')
+        if env is None:
+            env = os.environ.copy()
+        
+        base_url = env.get('API_BASE_URL')
+        api_key = env.get('API_KEY')
+        model_name = env.get('MODEL_NAME')
         
         if not all([base_url, api_key, model_name]):
             raise ValueError(
@@ -69,15 +133,15 @@ class APIConfig:
             base_url=base_url,
             api_key=api_key,
             model_name=model_name,
-            temperature=float(os.getenv('TEMPERATURE', '0.1')),
-            max_tokens=int(os.getenv('MAX_TOKENS', '2000')),
-            timeout=int(os.getenv('TIMEOUT', '30')),
-            http_proxy=os.getenv('HTTP_PROXY'),
-            https_proxy=os.getenv('HTTPS_PROXY')
+            temperature=_as_float(env, 'TEMPERATURE', 0.1),
+            max_tokens=_as_int(env, 'MAX_TOKENS', 2000),
+            timeout=_as_int(env, 'TIMEOUT', 30),
+            http_proxy=env.get('HTTP_PROXY'),
+            https_proxy=env.get('HTTPS_PROXY')
         )
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class PathConfig:
     """
     路径配置类
@@ -109,17 +173,16 @@ class PathConfig:
         Returns:
             PathConfig: 路径配置实例
         """
-        project_root = Path(__file__).parent
-        temp_dir = project_root / 'temp'
+        temp_dir = _PROJECT_ROOT / 'temp'
         
         return cls(
-            project_root=project_root,
+            project_root=_PROJECT_ROOT,
             temp_dir=temp_dir,
             toc_images_dir=temp_dir / 'toc_images',
             toc_json_dir=temp_dir / 'toc_json',
             debug_dir=temp_dir / 'debug',
-            schemas_dir=project_root / 'schemas',
-            prompts_dir=project_root / 'prompt'
+            schemas_dir=_PROJECT_ROOT / 'schemas',
+            prompts_dir=_PROJECT_ROOT / 'prompt'
         )
     
     def create_directories(self) -> None:
@@ -128,29 +191,43 @@ class PathConfig:
         
         如果目录不存在，则创建。已存在的目录不会被修改。
         """
-        for dir_path in [
-            self.temp_dir,
-            self.toc_images_dir,
-            self.toc_json_dir,
-            self.debug_dir
-        ]:
-            dir_path.mkdir(parents=True, exist_ok=True)
+        # 子目录都位于 temp_dir 下，makedirs 会一并创建父目录
+        for dir_path in (self.toc_images_dir, self.toc_json_dir, self.debug_dir):
+            os.makedirs(dir_path, exist_ok=True)
     
     def clean_temp_directories(self) -> None:
         """
         清理临时目录
         
         删除 temp/ 目录下的所有文件，但保留目录结构。
+        
+        标准子目录只清空内容而不删除重建，其余文件和目录直接删除。
         """
-        import shutil
+        keep_dirs = {
+            os.fspath(path)
+            for path in (self.toc_images_dir, self.toc_json_dir, self.debug_dir)
+        }
         
-        if self.temp_dir.exists():
-            shutil.rmtree(self.temp_dir)
+        def clear(dir_path: str) -> None:
+            try:
+                entries = os.scandir(dir_path)
+            except FileNotFoundError:
+                return
+            
+            with entries:
+                for entry in entries:
+                    if entry.path in keep_dirs:
+                        clear(entry.path)
+                    elif entry.is_dir(follow_symlinks=False):
+                        shutil.rmtree(entry.path)
+                    else:
+                        os.unlink(entry.path)
         
+        clear(os.fspath(self.temp_dir))
         self.create_directories()
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class OCRConfig:
     """
     OCR 配置类
@@ -164,6 +241,12 @@ class OCRConfig:
         image_quality: 图片质量（1-100）
         image_format: 图片格式
         min_confidence: 最小置信度阈值
+        max_concurrent_requests: 并行处理时的最大并发请求数
+        upload_max_edge: 发送给模型前图片最长边的上限（像素），0 表示不缩放
+        upload_quality: 发送给模型的 JPEG 图片质量（1-100）
+        use_batch_api: 批量处理时是否通过 Batch API 离线提交（费用更低，延迟更高）
+        batch_poll_interval: 轮询 Batch 任务状态的间隔（秒）
+        batch_timeout: 等待 Batch 任务完成的最长时间（秒），超时后取消任务
     """
     max_retries: int = 3
     retry_delay: float = 2.0
@@ -171,26 +254,44 @@ class OCRConfig:
     image_quality: int = 85
     image_format: str = "PNG"
     min_confidence: float = 0.6
+    max_concurrent_requests: int = 5
+    upload_max_edge: int = 1024
+    upload_quality: int = 90
+    use_batch_api: bool = False
+    batch_poll_interval: float = 30.0
+    batch_timeout: float = 86400.0
     
     @classmethod
-    def from_env(cls) -> 'OCRConfig':
+    def from_env(cls, env: Optional[Mapping[str, str]] = None) -> 'OCRConfig':
         """
         从环境变量加载 OCR 配置
         
+        Args:
+            env: 环境变量快照（可选，默认读取 os.environ）
+        
         Returns:
             OCRConfig: OCR 配置实例
         """
+        if env is None:
+            env = os.environ.copy()
+        
         return cls(
-            max_retries=int(os.getenv('OCR_MAX_RETRIES', '3')),
-            retry_delay=float(os.getenv('OCR_RETRY_DELAY', '2.0')),
-            image_max_size=int(os.getenv('OCR_IMAGE_MAX_SIZE', '2048')),
-            image_quality=int(os.getenv('OCR_IMAGE_QUALITY', '85')),
-            image_format=os.getenv('OCR_IMAGE_FORMAT', 'PNG'),
-            min_confidence=float(os.getenv('OCR_MIN_CONFIDENCE', '0.6'))
+            max_retries=_as_int(env, 'OCR_MAX_RETRIES', 3),
+            retry_delay=_as_float(env, 'OCR_RETRY_DELAY', 2.0),
+            image_max_size=_as_int(env, 'OCR_IMAGE_MAX_SIZE', 2048),
+            image_quality=_as_int(env, 'OCR_IMAGE_QUALITY', 85),
+            image_format=env.get('OCR_IMAGE_FORMAT', 'PNG'),
+            min_confidence=_as_float(env, 'OCR_MIN_CONFIDENCE', 0.6),
+            max_concurrent_requests=_as_int(env, 'OCR_MAX_CONCURRENT_REQUESTS', 5),
+            upload_max_edge=_as_int(env, 'OCR_UPLOAD_MAX_EDGE', 1024),
+            upload_quality=_as_int(env, 'OCR_UPLOAD_QUALITY', 90),
+            use_batch_api=_as_bool(env, 'OCR_USE_BATCH_API', False),
+            batch_poll_interval=_as_float(env, 'OCR_BATCH_POLL_INTERVAL', 30.0),
+            batch_timeout=_as_float(env, 'OCR_BATCH_TIMEOUT', 86400.0)
         )
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class Config:
     """
     全局配置类
@@ -214,30 +315,41 @@ class Config:
         Returns:
             Config: 配置实例
         """
+        # 加载项目根目录下的 .env 文件
+        _load_env(_PROJECT_ROOT / '.env')
+        
+        # 一次性读取环境变量快照，供各配置项共享
+        env = os.environ.copy()
+        
         return cls(
-            api=APIConfig.from_env(),
+            api=APIConfig.from_env(env),
             paths=PathConfig.default(),
-            ocr=OCRConfig.from_env()
+            ocr=OCRConfig.from_env(env)
         )
 
 
-# 全局配置实例
-config = Config.load()
-
-
+@functools.lru_cache(maxsize=1)
 def get_config() -> Config:
     """
     获取全局配置实例
     
+    配置在首次调用时才加载，因此导入本模块不要求环境变量已配置，
+    --help、--clean 等不调用 API 的命令也不会因缺少 API 配置而失败。
+    加载结果会被缓存，需要重新读取环境变量时调用 get_config.cache_clear()。
+    
     Returns:
         Config: 配置实例
+        
+    Raises:
+        ValueError: 如果必需的环境变量缺失
     """
-    return config
+    return Config.load()
 
 
+@functools.lru_cache(maxsize=None)
 def load_prompt(name: str) -> str:
     """
-    加载 Prompt 模板
+    加载 Prompt 模板（每个模板只读取一次）
     
     Args:
         name: Prompt 文件名（不含 .txt 扩展名）
@@ -248,7 +360,7 @@ def load_prompt(name: str) -> str:
     Raises:
         FileNotFoundError: 如果 Prompt 文件不存在
     """
-    prompt_path = config.paths.prompts_dir / f"{name}.txt"
+    prompt_path = get_config().paths.prompts_dir / f"{name}.txt"
     
     if not prompt_path.exists():
         raise FileNotFoundError(f"Prompt 文件不存在: {prompt_path}")
@@ -256,25 +368,25 @@ def load_prompt(name: str) -> str:
     return prompt_path.read_text(encoding='utf-8')
 
 
-def load_schema(name: str) -> dict:
+@functools.lru_cache(maxsize=None)
+def load_schema(name: str) -> Mapping[str, Any]:
     """
-    加载 JSON Schema
+    加载 JSON Schema（每个 Schema 只读取和解析一次）
+    
+    返回的结果在多次调用之间共享，因此以只读映射的形式返回。
     
     Args:
         name: Schema 文件名（不含 .schema.json 扩展名）
         
     Returns:
-        dict: JSON Schema 字典
+        Mapping: JSON Schema（只读）
         
     Raises:
         FileNotFoundError: 如果 Schema 文件不存在
     """
-    import json
-    
-    schema_path = config.paths.schemas_dir / f"{name}.schema.json"
+    schema_path = get_config().paths.schemas_dir / f"{name}.schema.json"
     
     if not schema_path.exists():
         raise FileNotFoundError(f"Schema 文件不存在: {schema_path}")
     
-    with open(schema_path, 'r', encoding='utf-8') as f:
-        return json.load(f)
+    return MappingProxyType(orjson.loads(schema_path.read_bytes()))
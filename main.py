@@ -8,15 +8,21 @@ PDF 目录自动添加工具 - 主程序
     python main.py
 """
 
+import argparse
+import atexit
+import os
+import queue
 import sys
 import logging
+import logging.handlers
+from datetime import datetime
 from pathlib import Path
-from typing import Optional
+from typing import Optional, Tuple
 
-from config import get_config
+from config import get_config, PathConfig
 from utils.pdf_extractor import (
     extract_and_optimize_toc_pages,
-    get_pdf_page_count,
+    inspect_pdf,
     parse_page_range
 )
 from utils.toc_merger import (
@@ -26,19 +32,24 @@ from utils.toc_merger import (
     export_toc_to_text,
     import_toc_from_text_file
 )
-from utils.pdf_writer import write_toc_safely, has_toc
-from agent.ocr_agent import OCRAgent, process_all_images
+from utils.pdf_writer import write_toc_safely
+from agent.ocr_agent import (
+    OCRAgent,
+    get_default_agent,
+    process_all_images
+)
 
 
 def setup_logging() -> str:
     """
     设置日志系统，同时输出到控制台和文件
     
+    日志记录只放入队列，由后台 QueueListener 线程统一写入控制台和文件，
+    并行 OCR 时工作线程不会在文件锁上互相等待。进程退出时停止监听并刷新剩余日志。
+    
     Returns:
         str: 日志文件的路径
     """
-    from datetime import datetime
-    
     # 创建日志目录
     log_dir = Path("logs")
     log_dir.mkdir(exist_ok=True)
@@ -47,21 +58,38 @@ def setup_logging() -> str:
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     log_file = log_dir / f"toc_builder_{timestamp}.log"
     
+    # 实际输出的处理器由后台监听线程持有
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    stream_handler = logging.StreamHandler(sys.stdout)
+    file_handler = logging.FileHandler(log_file, encoding='utf-8')
+    stream_handler.setFormatter(formatter)
+    file_handler.setFormatter(formatter)
+    
+    log_queue: queue.Queue = queue.Queue(-1)
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.setFormatter(logging.Formatter('%(message)s'))
+    
     # 配置日志
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.StreamHandler(sys.stdout),
-            logging.FileHandler(log_file, encoding='utf-8')
-        ]
-    )
+    logging.basicConfig(level=logging.INFO, handlers=[queue_handler])
+    
+    listener = logging.handlers.QueueListener(log_queue, stream_handler, file_handler)
+    listener.start()
+    atexit.register(listener.stop)
     
     return str(log_file)
 
 
 logger = logging.getLogger(__name__)
 
+def get_agent() -> OCRAgent:
+    """
+    获取 OCR Agent 实例（整个程序只创建一次，与 agent.ocr_agent 中的默认实例相同）
+    
+    Returns:
+        OCRAgent: OCR Agent 实例
+    """
+    return get_default_agent()
+
 
 def setup_environment() -> None:
     """
@@ -74,6 +102,101 @@ def setup_environment() -> None:
     logger.info("环境设置完成")
 
 
+def _validate_file(
+    path: str,
+    suffix: str,
+    wrong_type_message: str
+) -> Tuple[bool, Optional[str], Optional[str]]:
+    """
+    校验用户输入的文件路径
+    
+    只调用一次 os.stat 确认文件存在，扩展名直接在字符串上比较。
+    
+    Args:
+        path: 文件路径（已去除首尾空白）
+        suffix: 期望的扩展名（小写，如 '.pdf'）
+        wrong_type_message: 扩展名不匹配时的提示
+        
+    Returns:
+        tuple: (是否通过, 错误信息, 文件路径)
+    """
+    if not path:
+        return False, "路径不能为空", None
+    
+    try:
+        os.stat(path)
+    except OSError:
+        return False, f"文件不存在: {path}", None
+    
+    if not path.lower().endswith(suffix):
+        return False, wrong_type_message, None
+    
+    return True, None, path
+
+
+def _validate_pdf(path: str) -> Tuple[bool, Optional[str], Optional[str]]:
+    """
+    校验 PDF 文件路径
+    
+    Args:
+        path: 文件路径
+        
+    Returns:
+        tuple: (是否通过, 错误信息, 文件路径)
+    """
+    return _validate_file(path, '.pdf', "不是 PDF 文件")
+
+
+def _validate_txt(path: str) -> Tuple[bool, Optional[str], Optional[str]]:
+    """
+    校验文本文件路径
+    
+    Args:
+        path: 文件路径
+        
+    Returns:
+        tuple: (是否通过, 错误信息, 文件路径)
+    """
+    return _validate_file(path, '.txt', "不是文本文件")
+
+
+def _validate_range(text: str) -> Tuple[bool, Optional[str], Optional[Tuple[int, int]]]:
+    """
+    校验页码范围
+    
+    Args:
+        text: 页码范围字符串（如 "5-12"）
+        
+    Returns:
+        tuple: (是否通过, 错误信息, (起始页码, 结束页码))
+    """
+    try:
+        return True, None, parse_page_range(text)
+    except ValueError as e:
+        return False, str(e), None
+
+
+def _validate_offset(text: str) -> Tuple[bool, Optional[str], Optional[int]]:
+    """
+    校验页码偏置
+    
+    Args:
+        text: 用户输入的偏置值
+        
+    Returns:
+        tuple: (是否通过, 错误信息, 偏置值)
+    """
+    try:
+        page_offset = int(text)
+    except ValueError:
+        return False, "请输入有效的数字", None
+    
+    if page_offset < 1:
+        return False, "偏置值必须 >= 1", None
+    
+    return True, None, page_offset
+
+
 def get_user_input() -> tuple:
     """
     获取用户输入
@@ -81,7 +204,7 @@ def get_user_input() -> tuple:
     交互式获取 PDF 路径、目录页码范围、页码偏置等信息。
     
     Returns:
-        tuple: (pdf_path, page_range, page_offset) 或 ('txt', txt_path, pdf_path)
+        tuple: (pdf_path, (start, end), page_offset) 或 ('txt', txt_path, pdf_path)
     """
     print("\n" + "="*60)
     print("PDF 目录自动添加工具")
@@ -108,57 +231,37 @@ def get_user_input() -> tuple:
     
     # 获取 PDF 路径
     while True:
-        pdf_path = input("请输入 PDF 文件路径: ").strip()
-        
-        if not pdf_path:
-            print("❌ 路径不能为空")
-            continue
-        
-        pdf_path_obj = Path(pdf_path)
-        if not pdf_path_obj.exists():
-            print(f"❌ 文件不存在: {pdf_path}")
-            continue
-        
-        if pdf_path_obj.suffix.lower() != '.pdf':
-            print("❌ 不是 PDF 文件")
-            continue
-        
-        break
+        ok, error, pdf_path = _validate_pdf(input("请输入 PDF 文件路径: ").strip())
+        if ok:
+            break
+        print(f"❌ {error}")
     
     # 显示 PDF 信息
     try:
-        total_pages = get_pdf_page_count(pdf_path)
+        total_pages, existing_toc = inspect_pdf(pdf_path)
         print(f"✓ PDF 总页数: {total_pages}")
         
-        if has_toc(pdf_path):
+        if existing_toc:
             print("⚠️  该 PDF 已有目录，写入将覆盖现有目录")
     except Exception as e:
         print(f"⚠️  无法读取 PDF 信息: {e}")
     
     # 获取目录页码范围
     while True:
-        page_range = input("\n请输入目录页码范围 (例如 5-12): ").strip()
-        
-        try:
-            start, end = parse_page_range(page_range)
+        ok, error, page_range = _validate_range(input("\n请输入目录页码范围 (例如 5-12): ").strip())
+        if ok:
+            start, end = page_range
             print(f"✓ 将提取第 {start}-{end} 页，共 {end - start + 1} 页")
             break
-        except ValueError as e:
-            print(f"❌ {e}")
+        print(f"❌ {error}")
     
     # 获取页码偏置
     while True:
-        offset_input = input("\n请输入页码偏置 (书籍第1页是PDF的第几页): ").strip()
-        
-        try:
-            page_offset = int(offset_input)
-            if page_offset < 1:
-                print("❌ 偏置值必须 >= 1")
-                continue
+        ok, error, page_offset = _validate_offset(input("\n请输入页码偏置 (书籍第1页是PDF的第几页): ").strip())
+        if ok:
             print(f"✓ 页码偏置: {page_offset}")
             break
-        except ValueError:
-            print("❌ 请输入有效的数字")
+        print(f"❌ {error}")
     
     return pdf_path, page_range, page_offset
 
@@ -176,48 +279,24 @@ def get_text_import_input() -> tuple:
     
     # 获取文本文件路径
     while True:
-        txt_path = input("请输入 toc.txt 文件路径: ").strip()
-        
-        if not txt_path:
-            print("❌ 路径不能为空")
-            continue
-        
-        txt_path_obj = Path(txt_path)
-        if not txt_path_obj.exists():
-            print(f"❌ 文件不存在: {txt_path}")
-            continue
-        
-        if txt_path_obj.suffix.lower() != '.txt':
-            print("❌ 不是文本文件")
-            continue
-        
-        break
+        ok, error, txt_path = _validate_txt(input("请输入 toc.txt 文件路径: ").strip())
+        if ok:
+            break
+        print(f"❌ {error}")
     
     # 获取目标 PDF 路径
     while True:
-        pdf_path = input("\n请输入目标 PDF 文件路径: ").strip()
-        
-        if not pdf_path:
-            print("❌ 路径不能为空")
-            continue
-        
-        pdf_path_obj = Path(pdf_path)
-        if not pdf_path_obj.exists():
-            print(f"❌ 文件不存在: {pdf_path}")
-            continue
-        
-        if pdf_path_obj.suffix.lower() != '.pdf':
-            print("❌ 不是 PDF 文件")
-            continue
-        
-        break
+        ok, error, pdf_path = _validate_pdf(input("\n请输入目标 PDF 文件路径: ").strip())
+        if ok:
+            break
+        print(f"❌ {error}")
     
     # 显示 PDF 信息
     try:
-        total_pages = get_pdf_page_count(pdf_path)
+        total_pages, existing_toc = inspect_pdf(pdf_path)
         print(f"✓ PDF 总页数: {total_pages}")
         
-        if has_toc(pdf_path):
+        if existing_toc:
             print("⚠️  该 PDF 已有目录，写入将覆盖现有目录")
     except Exception as e:
         print(f"⚠️  无法读取 PDF 信息: {e}")
@@ -225,13 +304,13 @@ def get_text_import_input() -> tuple:
     return 'txt', txt_path, pdf_path
 
 
-def step_1_extract_images(pdf_path: str, page_range: str) -> list:
+def step_1_extract_images(pdf_path: str, page_range: Tuple[int, int]) -> list:
     """
     步骤 1: 提取目录页为图片
     
     Args:
         pdf_path: PDF 文件路径
-        page_range: 页码范围
+        page_range: 已解析的页码范围 (起始页码, 结束页码)
         
     Returns:
         list: 图片路径列表
@@ -266,9 +345,6 @@ def step_2_ocr_recognition(image_paths: list, parallel: bool = True) -> None:
     print("-"*60)
     
     try:
-        from agent.ocr_agent import process_all_images
-        from pathlib import Path
-        
         # 提取起始页码
         start_page = int(Path(image_paths[0]).stem.split('_')[1])
         
@@ -276,24 +352,13 @@ def step_2_ocr_recognition(image_paths: list, parallel: bool = True) -> None:
         total = len(image_paths)
         print(f"\n开始识别 {total} 页...")
         
-        if parallel:
-            # 并行处理
-            import asyncio
-            
-            async def process_async():
-                from agent.ocr_agent import OCRAgent
-                agent = OCRAgent()
-                return await _process_images_parallel(agent, image_paths, start_page)
-            
-            # 运行异步任务
-            results = asyncio.run(process_async())
-        else:
-            # 顺序处理
-            results = process_all_images(
-                image_paths=image_paths,
-                start_page_number=start_page,
-                parallel=False
-            )
+        # 并行/顺序以及是否走 Batch API（OCRConfig.use_batch_api）都由 process_all_images 决定
+        results = process_all_images(
+            image_paths=image_paths,
+            start_page_number=start_page,
+            parallel=parallel,
+            agent=get_agent()
+        )
         
         # 统计结果
         success_count = sum(1 for r in results if r.entries)
@@ -308,54 +373,10 @@ def step_2_ocr_recognition(image_paths: list, parallel: bool = True) -> None:
         sys.exit(1)
 
 
-async def _process_images_parallel(agent, image_paths: list, start_page_number: int):
-    """
-    并行处理图片的异步函数
-    
-    Args:
-        agent: OCR Agent 实例
-        image_paths: 图片路径列表
-        start_page_number: 起始页码
-        
-    Returns:
-        list: TOCPage 对象列表
-    """
-    import asyncio
-    from pathlib import Path
-    
-    async def process_one(image_path: str, page_number: int):
-        """异步处理单张图片"""
-        try:
-            print(f"  正在处理第 {page_number} 页...")
-            result = await asyncio.to_thread(
-                agent.process_image_to_toc_page,
-                image_path,
-                page_number
-            )
-            print(f"  ✓ 第 {page_number} 页完成 ({len(result.entries)} 个条目)")
-            return result
-        except Exception as e:
-            logger.error(f"处理失败 (页 {page_number}): {e}")
-            print(f"  ✗ 第 {page_number} 页失败: {e}")
-            from models import TOCPage
-            return TOCPage(page_number=page_number, entries=[])
-    
-    # 创建任务
-    tasks = [
-        process_one(image_path, start_page_number + i)
-        for i, image_path in enumerate(image_paths)
-    ]
-    
-    # 并行执行
-    results = await asyncio.gather(*tasks)
-    
-    return results
-
-
 def step_3_merge_toc(
     pdf_path: str,
     page_offset: int,
-    page_range: str
+    page_range: Tuple[int, int]
 ):
     """
     步骤 3: 合并目录数据
@@ -363,7 +384,7 @@ def step_3_merge_toc(
     Args:
         pdf_path: PDF 文件路径
         page_offset: 页码偏置
-        page_range: 页码范围
+        page_range: 已解析的页码范围 (起始页码, 结束页码)
         
     Returns:
         MergedTOC: 合并后的目录对象
@@ -379,7 +400,7 @@ def step_3_merge_toc(
         merged = merge_from_directory(
             pdf_path=pdf_path,
             page_offset=page_offset,
-            toc_page_range=page_range,
+            toc_page_range=f"{page_range[0]}-{page_range[1]}",
             output_path=str(output_path)
         )
         
@@ -509,7 +530,7 @@ def main() -> None:
             print("\n" + "="*60)
             print("配置信息:")
             print(f"  PDF 文件: {pdf_path}")
-            print(f"  目录页范围: {page_range}")
+            print(f"  目录页范围: {page_range[0]}-{page_range[1]}")
             print(f"  页码偏置: {page_offset}")
             print("="*60)
             
@@ -553,8 +574,6 @@ def cli() -> None:
     
     支持命令行参数（可选）。
     """
-    import argparse
-    
     parser = argparse.ArgumentParser(
         description='PDF 目录自动添加工具',
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -620,8 +639,8 @@ def cli() -> None:
     
     # 清理模式
     if args.clean:
-        config = get_config()
-        config.paths.clean_temp_directories()
+        # 只需要路径配置，不要求 API 环境变量
+        PathConfig.default().clean_temp_directories()
         print("✓ 临时文件已清理")
         sys.exit(0)
     
@@ -661,8 +680,17 @@ def run_cli_mode(
     try:
         setup_environment()
         
+        # 参数与交互模式使用同一套校验，页码范围只解析一次
+        ok, error, _ = _validate_pdf(pdf_path)
+        if not ok:
+            raise ValueError(error)
+        
+        ok, error, page_range = _validate_range(page_range)
+        if not ok:
+            raise ValueError(error)
+        
         print(f"处理 PDF: {pdf_path}")
-        print(f"目录范围: {page_range}")
+        print(f"目录范围: {page_range[0]}-{page_range[1]}")
         print(f"页码偏置: {page_offset}")
         print(f"并行处理: {'是' if parallel else '否'}")
         
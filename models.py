@@ -4,11 +4,14 @@
 定义项目中使用的所有数据模型和类型。
 """
 
-from dataclasses import dataclass, field, asdict
+from dataclasses import dataclass, field
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 from enum import Enum
-import json
+from pathlib import Path
+import sys
+
+import orjson
 
 
 class ImageQuality(str, Enum):
@@ -32,7 +35,7 @@ class ValidationStatus(str, Enum):
     INVALID = "invalid"
 
 
-@dataclass
+@dataclass(slots=True)
 class TOCEntry:
     """
     目录项数据模型
@@ -59,8 +62,8 @@ class TOCEntry:
         if not isinstance(self.level, int) or not (1 <= self.level <= 5):
             raise ValueError("level 必须是 1-5 之间的整数")
         
-        # 清理标题
-        self.title = self.title.strip()
+        # 清理标题（驻留字符串，重复的标题共享同一对象）
+        self.title = sys.intern(self.title.strip())
     
     def to_dict(self) -> Dict[str, Any]:
         """
@@ -105,7 +108,7 @@ class TOCEntry:
         return self.page + (offset - 1)
 
 
-@dataclass
+@dataclass(slots=True)
 class TOCPage:
     """
     单页目录数据模型
@@ -128,7 +131,11 @@ class TOCPage:
         Returns:
             list: 目录项字典列表
         """
-        return [entry.to_dict() for entry in self.entries]
+        # 内联 TOCEntry.to_dict，避免每个条目一次方法调用
+        return [
+            {'title': entry.title, 'page': entry.page, 'level': entry.level}
+            for entry in self.entries
+        ]
     
     @classmethod
     def from_dict(cls, page_number: int, data: List[Dict[str, Any]]) -> 'TOCPage':
@@ -142,7 +149,8 @@ class TOCPage:
         Returns:
             TOCPage: 单页目录实例
         """
-        entries = [TOCEntry.from_dict(entry_data) for entry_data in data]
+        entry_from_dict = TOCEntry.from_dict
+        entries = [entry_from_dict(entry_data) for entry_data in data]
         return cls(page_number=page_number, entries=entries)
     
     def save_to_file(self, file_path: str) -> None:
@@ -152,27 +160,56 @@ class TOCPage:
         Args:
             file_path: 文件路径
         """
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+        Path(file_path).write_bytes(orjson.dumps(self.to_dict(), option=orjson.OPT_INDENT_2))
+    
+    def save_to_file_fast(self, file_path: str) -> bool:
+        """
+        保存到 JSON 文件（orjson 序列化，内容未变化时跳过写入）
+        
+        输出格式与 save_to_file 相同。
+        
+        Args:
+            file_path: 文件路径
+            
+        Returns:
+            bool: 是否实际写入了文件（内容与已有文件相同时返回 False）
+        """
+        data = orjson.dumps(self.to_dict(), option=orjson.OPT_INDENT_2)
+        path = Path(file_path)
+        
+        # 先比较文件大小，大小相同时再比较内容
+        try:
+            if path.stat().st_size == len(data) and path.read_bytes() == data:
+                return False
+        except FileNotFoundError:
+            pass
+        
+        path.write_bytes(data)
+        return True
     
     @classmethod
     def load_from_file(cls, file_path: str, page_number: int) -> 'TOCPage':
         """
         从 JSON 文件加载
         
+        文件可能被手工编辑或来自旧版本，因此逐条校验；
+        含无效条目（如 level 超出 1-5）的文件会抛出 ValueError。
+        
         Args:
             file_path: 文件路径
             page_number: 页码
             
         Returns:
             TOCPage: 单页目录实例
+            
+        Raises:
+            ValueError: 如果文件中存在无效的目录项
         """
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        data = orjson.loads(Path(file_path).read_bytes())
         return cls.from_dict(page_number, data)
 
 
-@dataclass
+@dataclass(slots=True)
 class ImageAnalysisResult:
     """
     图片分析结果数据模型
@@ -203,7 +240,7 @@ class ImageAnalysisResult:
     notes: str = ""
 
 
-@dataclass
+@dataclass(slots=True)
 class ValidationResult:
     """
     验证结果数据模型
@@ -231,7 +268,7 @@ class ValidationResult:
         return self.status in [ValidationStatus.VALID, ValidationStatus.VALID_WITH_FIXES]
 
 
-@dataclass
+@dataclass(slots=True)
 class TOCMetadata:
     """
     目录元数据
@@ -260,12 +297,21 @@ class TOCMetadata:
         Returns:
             dict: 字典表示
         """
-        result = asdict(self)
-        # 移除 None 值
-        return {k: v for k, v in result.items() if v is not None}
+        result = {
+            'pdf_path': self.pdf_path,
+            'page_offset': self.page_offset,
+            'total_entries': self.total_entries,
+            'generated_at': self.generated_at
+        }
+        # 可选字段为 None 时不输出
+        if self.toc_page_range is not None:
+            result['toc_page_range'] = self.toc_page_range
+        if self.model_name is not None:
+            result['model_name'] = self.model_name
+        return result
 
 
-@dataclass
+@dataclass(slots=True)
 class MergedTOC:
     """
     合并后的完整目录数据模型
@@ -288,7 +334,11 @@ class MergedTOC:
         """
         return {
             'metadata': self.metadata.to_dict(),
-            'toc': [entry.to_dict() for entry in self.toc]
+            # 内联 TOCEntry.to_dict，避免每个条目一次方法调用
+            'toc': [
+                {'title': entry.title, 'page': entry.page, 'level': entry.level}
+                for entry in self.toc
+            ]
         }
     
     @classmethod
@@ -303,7 +353,8 @@ class MergedTOC:
             MergedTOC: 合并目录实例
         """
         metadata = TOCMetadata(**data['metadata'])
-        toc = [TOCEntry.from_dict(entry) for entry in data['toc']]
+        entry_from_dict = TOCEntry.from_dict
+        toc = [entry_from_dict(entry) for entry in data['toc']]
         return cls(metadata=metadata, toc=toc)
     
     def save_to_file(self, file_path: str) -> None:
@@ -313,8 +364,7 @@ class MergedTOC:
         Args:
             file_path: 文件路径
         """
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+        Path(file_path).write_bytes(orjson.dumps(self.to_dict(), option=orjson.OPT_INDENT_2))
     
     @classmethod
     def load_from_file(cls, file_path: str) -> 'MergedTOC':
@@ -327,8 +377,7 @@ class MergedTOC:
         Returns:
             MergedTOC: 合并目录实例
         """
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        data = orjson.loads(Path(file_path).read_bytes())
         return cls.from_dict(data)
     
     def get_entries_by_level(self, level: int) -> List[TOCEntry]:
@@ -350,15 +399,12 @@ class MergedTOC:
         Returns:
             list: 警告信息列表（如果页码顺序异常）
         """
-        warnings = []
-        for i in range(1, len(self.toc)):
-            prev_page = self.toc[i - 1].page
-            curr_page = self.toc[i].page
-            
-            if curr_page < prev_page:
-                warnings.append(
-                    f"条目 {i+1} ('{self.toc[i].title}') 的页码 ({curr_page}) "
-                    f"小于前一条 ({prev_page})"
-                )
-        
-        return warnings
+        # 先取出页码列表，相邻比较在推导式中完成，只为异常位置生成警告
+        toc = self.toc
+        pages = [entry.page for entry in toc]
+        return [
+            f"条目 {i+1} ('{toc[i].title}') 的页码 ({curr_page}) "
+            f"小于前一条 ({prev_page})"
+            for i, (prev_page, curr_page) in enumerate(zip(pages, pages[1:]), 1)
+            if curr_page < prev_page
+        ]
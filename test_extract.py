@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 import json
+import re
 
 test_response = '''```json
 [
@@ -16,24 +17,23 @@ test_response = '''```json
 ]
 ```'''
 
+# 代码块中的 JSON 数组或对象（模块加载时编译一次）
+_FENCED_JSON = re.compile(r'```(?:json)?\s*(\[.*?\]|\{.*?\})\s*```', re.DOTALL)
+
 def extract_json_from_response(response):
     response = response.strip()
     
+    # 已经是纯 JSON 时直接返回，不做代码块处理
+    try:
+        json.loads(response)
+        return response
+    except ValueError:
+        pass
+    
     # 查找 markdown 代码块
-    if '```' in response:
-        start_marker = response.find('```')
-        if start_marker != -1:
-            content_start = response.find('\n', start_marker) + 1
-            if content_start == 0:
-                content_start = start_marker + 3
-                if response[content_start:content_start+4] == 'json':
-                    content_start += 4
-            
-            end_marker = response.find('```', content_start)
-            if end_marker != -1:
-                json_str = response[content_start:end_marker].strip()
-                if json_str.startswith('[') or json_str.startswith('{'):
-                    return json_str
+    match = _FENCED_JSON.search(response)
+    if match:
+        return match.group(1)
     
     # 查找数组
     array_start = response.find('[')
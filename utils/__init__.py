@@ -9,7 +9,8 @@ from .toc_merger import (
     merge_toc_pages,
     load_page_json_files,
     import_toc_from_text_file,
-    parse_toc_from_text
+    parse_toc_from_text,
+    parse_toc_from_lines
 )
 from .pdf_writer import write_toc_to_pdf, create_pdf_outline
 
@@ -20,6 +21,7 @@ __all__ = [
     'load_page_json_files',
     'import_toc_from_text_file',
     'parse_toc_from_text',
+    'parse_toc_from_lines',
     'write_toc_to_pdf',
     'create_pdf_outline'
 ]
@@ -6,7 +6,7 @@ PDF 页面提取模块
 
 import fitz  # PyMuPDF
 from pathlib import Path
-from typing import List, Tuple, Optional
+from typing import List, Tuple, Optional, Union
 from PIL import Image
 import logging
 
@@ -14,13 +14,19 @@ from config import get_config
 
 logger = logging.getLogger(__name__)
 
+# PyMuPDF 能直接编码的 JPEG 格式名
+_PYMUPDF_JPEG_FORMATS = frozenset(("JPEG", "JPG"))
 
-def parse_page_range(page_range: str) -> Tuple[int, int]:
+
+def parse_page_range(page_range: Union[str, Tuple[int, int]]) -> Tuple[int, int]:
     """
     解析页码范围字符串
     
+    已解析过的 (起始页码, 结束页码) 元组会原样返回，
+    调用方解析一次后即可把元组一路传下去。
+    
     Args:
-        page_range: 页码范围字符串，格式如 "5-12" 或 "7-10"
+        page_range: 页码范围字符串，格式如 "5-12" 或 "7-10"；或已解析的元组
         
     Returns:
         tuple: (起始页码, 结束页码)，页码从 1 开始
@@ -33,7 +39,12 @@ def parse_page_range(page_range: str) -> Tuple[int, int]:
         (5, 12)
         >>> parse_page_range("1-3")
         (1, 3)
+        >>> parse_page_range((5, 12))
+        (5, 12)
     """
+    if isinstance(page_range, tuple):
+        return page_range
+    
     try:
         parts = page_range.strip().split('-')
         if len(parts) != 2:
@@ -59,7 +70,8 @@ def extract_single_page_to_image(
     page_number: int,
     output_path: str,
     dpi: int = 150,
-    image_format: str = "PNG"
+    image_format: str = "PNG",
+    max_size: Optional[int] = None
 ) -> str:
     """
     提取 PDF 单页为图片
@@ -70,6 +82,8 @@ def extract_single_page_to_image(
         output_path: 输出图片路径
         dpi: 图片 DPI（分辨率）
         image_format: 图片格式（PNG, JPEG 等）
+        max_size: 最大边长（像素，可选）；按 dpi 渲染会超过时直接以更低的分辨率渲染，
+            无需事后再缩放
         
     Returns:
         str: 输出图片的路径
@@ -90,59 +104,97 @@ def extract_single_page_to_image(
     try:
         # 打开 PDF
         doc = fitz.open(str(pdf_path))
+        try:
+            image_path = _render_page(doc, page_number, output_path, dpi, image_format, max_size)
+        finally:
+            doc.close()
         
-        # 验证页码范围
-        if page_number < 1 or page_number > len(doc):
-            raise ValueError(
-                f"页码 {page_number} 超出范围。"
-                f"PDF 共有 {len(doc)} 页"
-            )
-        
-        # 获取页面（PyMuPDF 从 0 开始计数）
-        page = doc[page_number - 1]
-        
-        # 计算缩放比例（DPI 转换）
-        zoom = dpi / 72  # 72 是 PDF 的默认 DPI
-        mat = fitz.Matrix(zoom, zoom)
-        
-        # 渲染为图片
-        pix = page.get_pixmap(matrix=mat)
-        
-        # 保存图片
-        output_path = Path(output_path)
-        output_path.parent.mkdir(parents=True, exist_ok=True)
-        
-        if image_format.upper() == "PNG":
-            pix.save(str(output_path))
-        else:
-            # 转换为 PIL Image 以支持其他格式
-            img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-            img.save(str(output_path), format=image_format)
-        
-        doc.close()
-        
-        logger.info(f"已提取第 {page_number} 页到: {output_path}")
-        return str(output_path)
+        logger.info(f"已提取第 {page_number} 页到: {image_path}")
+        return image_path
     
     except Exception as e:
         logger.error(f"提取页面失败: {e}")
         raise
 
 
+def _render_page(
+    doc: fitz.Document,
+    page_number: int,
+    output_path: str,
+    dpi: int,
+    image_format: str,
+    max_size: Optional[int]
+) -> str:
+    """
+    将已打开文档中的一页渲染并保存为图片
+    
+    Args:
+        doc: 已打开的 PDF 文档
+        page_number: 页码（从 1 开始）
+        output_path: 输出图片路径
+        dpi: 图片 DPI（分辨率）
+        image_format: 图片格式（PNG, JPEG 等）
+        max_size: 最大边长（像素，可选）
+        
+    Returns:
+        str: 输出图片的路径
+        
+    Raises:
+        ValueError: 如果页码超出范围
+    """
+    # 验证页码范围
+    if page_number < 1 or page_number > len(doc):
+        raise ValueError(
+            f"页码 {page_number} 超出范围。"
+            f"PDF 共有 {len(doc)} 页"
+        )
+    
+    # 获取页面（PyMuPDF 从 0 开始计数）
+    page = doc[page_number - 1]
+    
+    # 计算缩放比例（DPI 转换）
+    zoom = dpi / 72  # 72 是 PDF 的默认 DPI
+    if max_size is not None:
+        zoom = min(zoom, max_size / max(page.rect.width, page.rect.height))
+    mat = fitz.Matrix(zoom, zoom)
+    
+    # 渲染为图片
+    pix = page.get_pixmap(matrix=mat)
+    
+    # 保存图片
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    
+    fmt = image_format.upper()
+    if fmt == "PNG":
+        pix.save(str(output_path))
+    elif fmt in _PYMUPDF_JPEG_FORMATS and pix.n == 3:
+        # RGB 图 PyMuPDF 可直接编码 JPEG，无需复制像素到 PIL
+        pix.save(str(output_path), output="jpeg")
+    else:
+        # 转换为 PIL Image 以支持其他格式
+        img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+        img.save(str(output_path), format=image_format)
+    
+    return str(output_path)
+
+
 def extract_toc_pages_to_images(
     pdf_path: str,
-    page_range: str,
+    page_range: Union[str, Tuple[int, int]],
     output_dir: Optional[str] = None,
-    dpi: int = 150
+    dpi: int = 150,
+    max_size: Optional[int] = None
 ) -> List[str]:
     """
     批量提取 PDF 目录页为图片
     
     Args:
         pdf_path: PDF 文件路径
-        page_range: 页码范围字符串（如 "5-12"）
+        page_range: 页码范围字符串（如 "5-12"）或已解析的元组
         output_dir: 输出目录路径（可选，默认使用配置中的路径）
         dpi: 图片 DPI（分辨率）
+        max_size: 最大边长（像素，可选），见 extract_single_page_to_image
         
     Returns:
         list: 生成的图片路径列表
@@ -178,23 +230,34 @@ def extract_toc_pages_to_images(
     
     logger.info(f"开始提取 {total_pages} 页目录图片...")
     
-    for page_num in range(start_page, end_page + 1):
-        output_path = output_dir / f"page_{page_num}.{extension}"
-        
-        try:
-            image_path = extract_single_page_to_image(
-                pdf_path=pdf_path,
-                page_number=page_num,
-                output_path=str(output_path),
-                dpi=dpi,
-                image_format=image_format
-            )
-            image_paths.append(image_path)
-            
-        except Exception as e:
-            logger.error(f"提取第 {page_num} 页失败: {e}")
-            # 继续处理其他页面
-            continue
+    if not Path(pdf_path).exists():
+        raise FileNotFoundError(f"PDF 文件不存在: {pdf_path}")
+    
+    page_numbers = range(start_page, end_page + 1)
+    output_paths = [str(output_dir / f"page_{page_num}.{extension}") for page_num in page_numbers]
+    
+    # MuPDF 不支持多线程渲染；目录通常只有几页到十几页，单页渲染仅需几十毫秒，
+    # 子进程的启动和导入开销远大于渲染本身，因此在当前进程中只打开一次文档顺序渲染
+    results: List[Union[str, Exception]] = []
+    doc = fitz.open(str(pdf_path))
+    try:
+        for page_num, output_path in zip(page_numbers, output_paths):
+            try:
+                results.append(
+                    _render_page(doc, page_num, output_path, dpi, image_format, max_size)
+                )
+            except Exception as e:
+                results.append(e)
+    finally:
+        doc.close()
+    
+    # 按页码顺序汇总结果，失败的页面记录后继续处理其他页面
+    for page_num, result in zip(page_numbers, results):
+        if isinstance(result, Exception):
+            logger.error(f"提取第 {page_num} 页失败: {result}")
+        else:
+            logger.info(f"已提取第 {page_num} 页到: {result}")
+            image_paths.append(result)
     
     logger.info(f"✓ 成功提取 {len(image_paths)}/{total_pages} 页")
     
@@ -226,6 +289,29 @@ def get_pdf_page_count(pdf_path: str) -> int:
     return page_count
 
 
+def inspect_pdf(pdf_path: str) -> Tuple[int, bool]:
+    """
+    一次打开 PDF，同时获取总页数和是否已有目录
+    
+    相当于 get_pdf_page_count + has_toc，但只解析一次文档。
+    
+    Args:
+        pdf_path: PDF 文件路径
+        
+    Returns:
+        tuple: (总页数, 是否已有目录)
+        
+    Examples:
+        >>> inspect_pdf("book.pdf")
+        (320, False)
+    """
+    doc = fitz.open(pdf_path)
+    try:
+        return doc.page_count, bool(doc.get_toc())
+    finally:
+        doc.close()
+
+
 def optimize_image_for_ocr(
     image_path: str,
     max_size: Optional[int] = None,
@@ -235,6 +321,8 @@ def optimize_image_for_ocr(
     优化图片以提高 OCR 识别率
     
     包括调整大小、增强对比度、降噪等操作。
+    无需缩放和模式转换的 PNG 图片直接返回，不再解码和重新保存
+    （PNG 为无损格式，quality 参数对其无效）。
     
     Args:
         image_path: 图片路径
@@ -256,10 +344,16 @@ def optimize_image_for_ocr(
     if quality is None:
         quality = config.ocr.image_quality
     
+    # Image.open 只读取文件头，判断是否需要处理时不会解码像素
     img = Image.open(image_path)
     
+    needs_resize = max(img.size) > max_size
+    if not needs_resize and img.mode != 'RGBA' and img.format == 'PNG':
+        img.close()
+        return image_path
+    
     # 调整大小
-    if max(img.size) > max_size:
+    if needs_resize:
         ratio = max_size / max(img.size)
         new_size = (int(img.width * ratio), int(img.height * ratio))
         img = img.resize(new_size, Image.Resampling.LANCZOS)
@@ -277,7 +371,7 @@ def optimize_image_for_ocr(
 
 def extract_and_optimize_toc_pages(
     pdf_path: str,
-    page_range: str,
+    page_range: Union[str, Tuple[int, int]],
     output_dir: Optional[str] = None
 ) -> List[str]:
     """
@@ -285,16 +379,21 @@ def extract_and_optimize_toc_pages(
     
     Args:
         pdf_path: PDF 文件路径
-        page_range: 页码范围字符串
+        page_range: 页码范围字符串或已解析的元组
         output_dir: 输出目录（可选）
         
     Returns:
         list: 优化后的图片路径列表
     """
-    # 提取图片
-    image_paths = extract_toc_pages_to_images(pdf_path, page_range, output_dir)
-    
-    # 逐个优化
+    # 提取图片（直接按最大边长渲染，优化时不再需要缩放）
+    image_paths = extract_toc_pages_to_images(
+        pdf_path,
+        page_range,
+        output_dir,
+        max_size=get_config().ocr.image_max_size
+    )
+    
+    # 逐个优化（已按最大边长渲染的 PNG 会在 optimize_image_for_ocr 中直接跳过）
     logger.info("正在优化图片以提高 OCR 识别率...")
     optimized_paths = []
     
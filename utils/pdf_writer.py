@@ -5,14 +5,46 @@ PDF TOC 写入模块
 """
 
 import fitz  # PyMuPDF
+import shutil
+import sys
 from pathlib import Path
 from typing import List, Tuple, Optional
 import logging
 
+if sys.platform.startswith('linux'):
+    import fcntl
+
 from models import MergedTOC, TOCEntry
 
 logger = logging.getLogger(__name__)
 
+# Linux 的 FICLONE ioctl（_IOW(0x94, 9, int)），在 btrfs/XFS 等文件系统上做写时复制克隆
+_FICLONE = 0x40049409
+
+
+def _backup_file(src: Path, dst: Path) -> None:
+    """
+    备份文件
+    
+    优先使用写时复制克隆（reflink），无论文件多大都不需要复制数据；
+    文件系统不支持时退回 shutil.copy2 完整复制。
+    不能用硬链接：增量保存会直接修改原文件，硬链接的备份会被一起改掉。
+    
+    Args:
+        src: 源文件路径
+        dst: 备份文件路径
+    """
+    if sys.platform.startswith('linux'):
+        try:
+            with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+                fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+            shutil.copystat(src, dst)
+            return
+        except OSError:
+            pass
+    
+    shutil.copy2(src, dst)
+
 
 def create_pdf_outline(
     merged: MergedTOC,
@@ -37,59 +69,51 @@ def create_pdf_outline(
         >>> outline[0]
         (1, '第一章 绪论', 15)
     """
-    outline = []
-    offset = merged.metadata.page_offset if apply_offset else 1
-    filtered_count = 0
-    fixed_count = 0
-    
-    for i, entry in enumerate(merged.toc):
-        # 跳过负数页码的条目（二次保护）
-        if entry.page < 0:
-            filtered_count += 1
-            logger.warning(f"跳过负数页码条目: {entry.title} (page={entry.page})")
-            continue
-        
-        # 计算 PDF 实际页码
-        pdf_page = entry.apply_offset(offset)
-        
-        # 验证应用偏移后的页码是否有效
-        if pdf_page < 1:
-            filtered_count += 1
-            logger.warning(f"跳过无效页码条目: {entry.title} (原始page={entry.page}, 应用offset后={pdf_page})")
-            continue
+    # 书籍页码 + page_shift = PDF 实际页码（与 TOCEntry.apply_offset 相同）
+    page_shift = (merged.metadata.page_offset if apply_offset else 1) - 1
+    
+    # 第一遍：过滤无效页码并应用偏置
+    outline = [
+        (entry.level, entry.title, entry.page + page_shift)
+        for entry in merged.toc
+        if entry.page >= 0
+        and entry.page + page_shift >= 1
+        and (max_page is None or entry.page + page_shift <= max_page)
+    ]
+    
+    filtered_count = len(merged.toc) - len(outline)
+    if filtered_count > 0:
+        # 只有存在被过滤的条目时才逐条说明原因
+        for entry in merged.toc:
+            pdf_page = entry.page + page_shift
+            if entry.page < 0:
+                # 跳过负数页码的条目（二次保护）
+                logger.warning(f"跳过负数页码条目: {entry.title} (page={entry.page})")
+            elif pdf_page < 1:
+                logger.warning(f"跳过无效页码条目: {entry.title} (原始page={entry.page}, 应用offset后={pdf_page})")
+            elif max_page is not None and pdf_page > max_page:
+                logger.warning(f"跳过超出范围的页码: {entry.title} (page={pdf_page}, PDF最大页={max_page})")
         
-        # 验证页码是否超出 PDF 范围
-        if max_page is not None and pdf_page > max_page:
-            filtered_count += 1
-            logger.warning(f"跳过超出范围的页码: {entry.title} (page={pdf_page}, PDF最大页={max_page})")
+        logger.info(f"创建大纲时过滤了 {filtered_count} 个无效页码条目")
+    
+    # 第二遍：修正层级以符合 PyMuPDF 要求
+    # 第一个条目必须是 level 1，之后层级最多比前一条深 1 级且不小于 1
+    fixed_count = 0
+    prev_level = 0
+    for i, (level, title, pdf_page) in enumerate(outline):
+        if level > prev_level + 1:
+            logger.debug(f"修正层级跳跃: {title[:30]} ({level} -> {prev_level + 1})")
+            level = prev_level + 1
+        elif level < 1:
+            logger.debug(f"修正无效层级: {title[:30]} ({level} -> 1)")
+            level = 1
+        else:
+            prev_level = level
             continue
         
-        # 修正层级以符合 PyMuPDF 要求
-        level = entry.level
-        if i == 0:
-            # 第一个条目必须是 level 1
-            if level != 1:
-                logger.debug(f"修正第 1 个条目层级: {level} -> 1")
-                level = 1
-                fixed_count += 1
-        else:
-            prev_level = outline[-1][0]
-            # 如果层级跳跃超过 1，修正为 prev_level + 1
-            if level > prev_level + 1:
-                logger.debug(f"修正层级跳跃: {entry.title[:30]} ({level} -> {prev_level + 1})")
-                level = prev_level + 1
-                fixed_count += 1
-            # 如果层级小于 1，修正为 1
-            elif level < 1:
-                logger.debug(f"修正无效层级: {entry.title[:30]} ({level} -> 1)")
-                level = 1
-                fixed_count += 1
-        
-        # PyMuPDF 的大纲格式：(层级, 标题, 页码)
-        outline.append((level, entry.title, pdf_page))
-    
-    if filtered_count > 0:
-        logger.info(f"创建大纲时过滤了 {filtered_count} 个无效页码条目")
+        fixed_count += 1
+        outline[i] = (level, title, pdf_page)
+        prev_level = level
     
     if fixed_count > 0:
         logger.info(f"修正了 {fixed_count} 个层级问题")
@@ -141,8 +165,7 @@ def write_toc_to_pdf(
     # 备份原文件
     if backup and output_path == pdf_path:
         backup_path = pdf_path.with_suffix('.pdf.backup')
-        import shutil
-        shutil.copy2(pdf_path, backup_path)
+        _backup_file(pdf_path, backup_path)
         logger.info(f"已备份原文件到: {backup_path}")
     
     try:
@@ -168,7 +191,13 @@ def write_toc_to_pdf(
         # 注意：如果覆盖原文件，必须使用 incremental=True
         if Path(output_path) == Path(pdf_path):
             # 覆盖原文件 - 使用增量保存
-            doc.saveIncr()
+            doc.save(
+                str(pdf_path),
+                incremental=True,
+                encryption=fitz.PDF_ENCRYPT_KEEP,
+                garbage=0,
+                clean=False
+            )
             logger.info("使用增量保存模式（覆盖原文件）")
         else:
             # 另存为新文件 - 可以使用优化选项
@@ -209,11 +238,8 @@ def get_existing_toc(pdf_path: str) -> List[Tuple[int, str, int]]:
     if not pdf_path.exists():
         raise FileNotFoundError(f"PDF 文件不存在: {pdf_path}")
     
-    doc = fitz.open(str(pdf_path))
-    toc = doc.get_toc()
-    doc.close()
-    
-    return toc
+    with fitz.open(str(pdf_path)) as doc:
+        return doc.get_toc()
 
 
 def has_toc(pdf_path: str) -> bool:
@@ -341,9 +367,10 @@ def validate_toc_before_write(
     
     # 获取 PDF 页数
     try:
-        doc = fitz.open(str(pdf_path))
-        total_pages = len(doc)
-        doc.close()
+        # 页数和现有目录从同一次打开中读取
+        with fitz.open(str(pdf_path)) as doc:
+            total_pages = len(doc)
+            existing_toc = doc.get_toc()
         
         # 检查页码范围，传入总页数进行过滤
         outline = create_pdf_outline(merged, max_page=total_pages)
@@ -351,7 +378,6 @@ def validate_toc_before_write(
         if not outline:
             errors.append("过滤后没有有效的目录条目")
         else:
-            max_page = max(item[2] for item in outline)
             min_page = min(item[2] for item in outline)
             
             # 检查是否有无效页码（虽然已经过滤，但仍做检查）
@@ -359,7 +385,7 @@ def validate_toc_before_write(
                 errors.append(f"存在无效页码: {min_page}")
         
         # 检查是否已有目录
-        if has_toc(pdf_path):
+        if existing_toc:
             warnings.append("PDF 已有目录，写入将覆盖现有目录")
     
     except Exception as e:
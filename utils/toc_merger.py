@@ -4,9 +4,14 @@
 负责读取和合并多个单页目录 JSON 文件。
 """
 
-import json
+import heapq
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+from operator import attrgetter
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import Iterable, List, Dict, Any, Optional, Tuple
 import logging
 
 from models import TOCPage, TOCEntry, MergedTOC, TOCMetadata
@@ -14,6 +19,53 @@ from config import get_config
 
 logger = logging.getLogger(__name__)
 
+# toc.txt 中的目录行：缩进 + 标题 ... 页码 (PDF: N)
+_TOC_LINE_RE = re.compile(r'^(\s*)(.+?)\s+\.\.\.\s+(\d+)\s+\(PDF:\s+\d+\)')
+
+# 常见层级对应的缩进字符串，按 level - 1 索引
+_INDENTS = tuple('  ' * i for i in range(6))
+
+# 缩进长度 -> 层级（每2个空格为1级），更深的缩进统一归为第5级
+_INDENT_LEVELS = {width: width // 2 + 1 for width in range(10)}
+
+
+def _indent_for(level: int) -> str:
+    """
+    返回层级对应的缩进字符串
+    
+    超出预计算范围的层级（如未经校验的 0 或 7）退回逐次计算，
+    结果与 "  " * (level - 1) 完全相同。
+    
+    Args:
+        level: 目录层级
+        
+    Returns:
+        str: 缩进字符串（每级 2 个空格）
+    """
+    if 1 <= level <= len(_INDENTS):
+        return _INDENTS[level - 1]
+    return '  ' * (level - 1)
+
+
+def _load_one(item: Tuple[int, str, str]) -> Optional[TOCPage]:
+    """
+    加载单个 page_N.json 文件
+    
+    Args:
+        item: (页码, 文件名, 文件路径)
+        
+    Returns:
+        Optional[TOCPage]: 单页目录对象，加载失败时返回 None
+    """
+    page_number, name, path = item
+    try:
+        # 加载数据
+        return TOCPage.load_from_file(path, page_number)
+    
+    except Exception as e:
+        logger.error(f"✗ 加载文件失败 {name}: {e}")
+        return None
+
 
 def load_page_json_files(json_dir: Optional[str] = None) -> List[TOCPage]:
     """
@@ -43,44 +95,63 @@ def load_page_json_files(json_dir: Optional[str] = None) -> List[TOCPage]:
     if not json_dir.exists():
         raise FileNotFoundError(f"目录不存在: {json_dir}")
     
-    # 查找所有 page_*.json 文件
-    json_files = sorted(json_dir.glob('page_*.json'))
+    # 查找所有 page_*.json 文件（scandir 直接按文件名过滤，不创建 Path 对象）
+    with os.scandir(json_dir) as it:
+        json_files = [
+            (entry.name, entry.path)
+            for entry in it
+            if entry.name.startswith('page_') and entry.name.endswith('.json')
+            and entry.is_file()
+        ]
     
     if not json_files:
         raise FileNotFoundError(f"未找到任何 page_*.json 文件: {json_dir}")
     
     logger.info(f"找到 {len(json_files)} 个 JSON 文件")
     
-    # 加载并解析
-    pages = []
-    for json_file in json_files:
+    # 从文件名提取页码，加载前按页码（数值）排序一次
+    numbered_files = []
+    for name, path in json_files:
         try:
-            # 从文件名提取页码
-            page_number = int(json_file.stem.split('_')[1])
-            
-            # 加载数据
-            page = TOCPage.load_from_file(str(json_file), page_number)
-            pages.append(page)
-            
-            logger.info(f"✓ 加载 {json_file.name}: {len(page.entries)} 个条目")
-        
-        except Exception as e:
-            logger.error(f"✗ 加载文件失败 {json_file.name}: {e}")
-            # 继续处理其他文件
-            continue
-    
-    # 按页码排序
-    pages.sort(key=lambda p: p.page_number)
+            # 'page_' 与 '.json' 之间第一个 '_' 之前的部分（page_1_copy.json -> 1）
+            numbered_files.append((int(name[5:-5].split('_', 1)[0]), name, path))
+        except ValueError as e:
+            logger.error(f"✗ 加载文件失败 {name}: {e}")
+    numbered_files.sort()
+    
+    if not numbered_files:
+        return []
+    
+    # 并行加载并解析（文件读取期间会释放 GIL），结果按页码顺序返回
+    with ThreadPoolExecutor(max_workers=min(32, len(numbered_files))) as executor:
+        results = list(executor.map(_load_one, numbered_files))
+    
+    # 加载失败的文件已记录日志，跳过后继续处理其他文件
+    pages = [page for page in results if page is not None]
+    
+    # 成功加载的文件汇总为一条日志（并行加载时逐文件日志顺序也不可靠）
+    if pages and logger.isEnabledFor(logging.INFO):
+        logger.info("✓ 已加载: " + ", ".join(
+            f"{name} ({len(page.entries)} 个条目)"
+            for (_, name, _), page in zip(numbered_files, results)
+            if page is not None
+        ))
     
     return pages
 
 
+def _is_sorted_by_page(entries: List[TOCEntry]) -> bool:
+    """检查条目是否已按页码非递减排列"""
+    return all(a.page <= b.page for a, b in zip(entries, entries[1:]))
+
+
 def merge_toc_pages(
     pages: List[TOCPage],
     pdf_path: str,
     page_offset: int,
     toc_page_range: Optional[str] = None,
-    model_name: Optional[str] = None
+    model_name: Optional[str] = None,
+    validate: bool = False
 ) -> MergedTOC:
     """
     合并多个单页目录为完整目录
@@ -91,6 +162,8 @@ def merge_toc_pages(
         page_offset: 页码偏置值
         toc_page_range: 目录页码范围字符串（可选）
         model_name: 使用的 AI 模型名称（可选）
+        validate: 合并后是否再检查一遍页码顺序（结果已排序，默认跳过；
+            完整检查见 validate_merged_toc）
         
     Returns:
         MergedTOC: 合并后的完整目录对象
@@ -106,24 +179,26 @@ def merge_toc_pages(
     if not pages:
         raise ValueError("没有可合并的页面数据")
     
-    # 收集所有目录项
-    all_entries: List[TOCEntry] = []
-    filtered_count = 0
-    
-    for page in pages:
-        for entry in page.entries:
-            # 过滤掉负数页码的条目
-            if entry.page >= 0:
-                all_entries.append(entry)
-            else:
-                filtered_count += 1
-                logger.warning(f"过滤掉负数页码条目: {entry.title} (page={entry.page})")
+    # 按页分别过滤掉负数页码的条目
+    runs = [[entry for entry in page.entries if entry.page >= 0] for page in pages]
+    filtered_count = sum(len(page.entries) for page in pages) - sum(map(len, runs))
     
     if filtered_count > 0:
+        # 只有存在被过滤的条目且会输出警告时才逐条说明
+        if logger.isEnabledFor(logging.WARNING):
+            for entry in chain.from_iterable(page.entries for page in pages):
+                if entry.page < 0:
+                    logger.warning(f"过滤掉负数页码条目: {entry.title} (page={entry.page})")
         logger.info(f"已过滤 {filtered_count} 个负数页码条目")
     
-    # 按页码排序所有条目
-    all_entries.sort(key=lambda e: e.page)
+    # 按页码排序所有条目：每页条目通常已有序，此时只需 K 路归并；
+    # 否则退回整体排序。两种方式对同页码条目都保持原有先后顺序
+    page_key = attrgetter('page')
+    if all(_is_sorted_by_page(run) for run in runs):
+        all_entries: List[TOCEntry] = list(heapq.merge(*runs, key=page_key))
+    else:
+        all_entries = list(chain.from_iterable(runs))
+        all_entries.sort(key=page_key)
     logger.info(f"已按页码排序 {len(all_entries)} 个条目")
     
     total_entries = len(all_entries)
@@ -142,12 +217,13 @@ def merge_toc_pages(
     # 创建合并对象
     merged = MergedTOC(metadata=metadata, toc=all_entries)
     
-    # 验证页码顺序（现在应该没有问题了）
-    warnings = merged.validate_page_order()
-    if warnings:
-        logger.warning("发现页码顺序异常:")
-        for warning in warnings:
-            logger.warning(f"  - {warning}")
+    # 条目已按页码排序，顺序检查仅在显式要求时执行
+    if validate:
+        warnings = merged.validate_page_order()
+        if warnings:
+            logger.warning("发现页码顺序异常:")
+            for warning in warnings:
+                logger.warning(f"  - {warning}")
     
     return merged
 
@@ -229,27 +305,58 @@ def validate_merged_toc(merged: MergedTOC) -> Dict[str, Any]:
     if not merged.toc:
         errors.append("目录为空")
     
-    # 2. 检查页码顺序
-    page_warnings = merged.validate_page_order()
-    warnings.extend(page_warnings)
-    
-    # 3. 检查层级跳跃
-    for i in range(1, len(merged.toc)):
-        prev_level = merged.toc[i - 1].level
-        curr_level = merged.toc[i].level
+    # 2-5. 一次遍历完成页码顺序、层级跳跃、页码范围、重复标题检查和层级统计
+    # 页码顺序警告单独收集，保持其排在层级警告之前
+    # （与 MergedTOC.validate_page_order 的输出一致）
+    page_warnings = []
+    level_warnings = []
+    min_page = max_page = None
+    prev_page = prev_level = None
+    seen_titles = set()
+    duplicates: Dict[str, None] = {}  # 按首次重复的顺序记录
+    level_counts = dict.fromkeys(range(1, 6), 0)
+    
+    for i, entry in enumerate(merged.toc):
+        page = entry.page
+        level = entry.level
+        title = entry.title
+        
+        # 页码不应小于前一条
+        if prev_page is not None and page < prev_page:
+            page_warnings.append(
+                f"条目 {i+1} ('{title}') 的页码 ({page}) "
+                f"小于前一条 ({prev_page})"
+            )
+        prev_page = page
         
         # 层级不应该跳跃超过 1（如从 1 直接到 3）
-        if curr_level > prev_level + 1:
-            warnings.append(
-                f"条目 {i+1} ('{merged.toc[i].title}') 的层级 ({curr_level}) "
+        if prev_level is not None and level > prev_level + 1:
+            level_warnings.append(
+                f"条目 {i+1} ('{title}') 的层级 ({level}) "
                 f"从上一条 ({prev_level}) 跳跃过大"
             )
+        prev_level = level
+        
+        if min_page is None:
+            min_page = max_page = page
+        elif page < min_page:
+            min_page = page
+        elif page > max_page:
+            max_page = page
+        
+        if title in seen_titles:
+            duplicates[title] = None
+        else:
+            seen_titles.add(title)
+        
+        if level in level_counts:
+            level_counts[level] += 1
+    
+    warnings.extend(page_warnings)
+    warnings.extend(level_warnings)
     
     # 4. 检查页码范围
-    if merged.toc:
-        min_page = min(entry.page for entry in merged.toc)
-        max_page = max(entry.page for entry in merged.toc)
-        
+    if min_page is not None:
         if min_page < 1:
             errors.append(f"存在无效页码: {min_page}")
         
@@ -257,17 +364,8 @@ def validate_merged_toc(merged: MergedTOC) -> Dict[str, Any]:
             warnings.append(f"页码过大: {max_page}")
     
     # 5. 检查重复标题
-    titles = [entry.title for entry in merged.toc]
-    seen = set()
-    duplicates = []
-    
-    for title in titles:
-        if title in seen:
-            duplicates.append(title)
-        seen.add(title)
-    
     if duplicates:
-        warnings.append(f"发现重复标题: {', '.join(set(duplicates))}")
+        warnings.append(f"发现重复标题: {', '.join(duplicates)}")
     
     is_valid = len(errors) == 0
     
@@ -277,11 +375,8 @@ def validate_merged_toc(merged: MergedTOC) -> Dict[str, Any]:
         'warnings': warnings,
         'errors': errors,
         'statistics': {
-            'level_1_count': len(merged.get_entries_by_level(1)),
-            'level_2_count': len(merged.get_entries_by_level(2)),
-            'level_3_count': len(merged.get_entries_by_level(3)),
-            'level_4_count': len(merged.get_entries_by_level(4)),
-            'level_5_count': len(merged.get_entries_by_level(5)),
+            f'level_{level}_count': count
+            for level, count in level_counts.items()
         }
     }
 
@@ -312,7 +407,7 @@ def print_toc_summary(merged: MergedTOC) -> None:
     
     print("\n前 5 个条目:")
     for i, entry in enumerate(merged.toc[:5], 1):
-        indent = "  " * (entry.level - 1)
+        indent = _indent_for(entry.level)
         print(f"  {i}. {indent}{entry.title} ... {entry.page}")
     
     if len(merged.toc) > 5:
@@ -334,24 +429,36 @@ def export_toc_to_text(merged: MergedTOC, output_path: str) -> None:
     Examples:
         >>> export_toc_to_text(merged, "toc.txt")
     """
+    metadata = merged.metadata
+    parts = [
+        "="*60 + "\n",
+        "PDF 目录\n",
+        "="*60 + "\n\n",
+        f"文件: {metadata.pdf_path}\n",
+        f"页码偏置: {metadata.page_offset}\n",
+        f"总条目数: {metadata.total_entries}\n\n",
+        "-"*60 + "\n\n",
+    ]
+    
+    # 书籍页码 + page_shift = PDF 实际页码（与 TOCEntry.apply_offset 相同）
+    page_shift = metadata.page_offset - 1
+    # 一次性取出 (title, page, level)，避免循环体内重复的属性查找
+    entry_fields = attrgetter('title', 'page', 'level')
+    for title, page, level in map(entry_fields, merged.toc):
+        indent = _indent_for(level)
+        parts.append(f"{indent}{title} ... {page} (PDF: {page + page_shift})\n")
+    
+    # 拼接后一次写入
     with open(output_path, 'w', encoding='utf-8') as f:
-        f.write("="*60 + "\n")
-        f.write("PDF 目录\n")
-        f.write("="*60 + "\n\n")
-        f.write(f"文件: {merged.metadata.pdf_path}\n")
-        f.write(f"页码偏置: {merged.metadata.page_offset}\n")
-        f.write(f"总条目数: {merged.metadata.total_entries}\n\n")
-        f.write("-"*60 + "\n\n")
-        
-        for entry in merged.toc:
-            indent = "  " * (entry.level - 1)
-            pdf_page = entry.apply_offset(merged.metadata.page_offset)
-            f.write(f"{indent}{entry.title} ... {entry.page} (PDF: {pdf_page})\n")
+        f.write(''.join(parts))
     
     logger.info(f"✓ 已导出文本格式目录到: {output_path}")
 
 
-def parse_toc_from_text(text_content: str) -> tuple[List[TOCEntry], Dict[str, Any]]:
+def parse_toc_from_text(
+    text_content: str,
+    parse_metadata: bool = True
+) -> tuple[List[TOCEntry], Dict[str, Any]]:
     """
     从文本格式解析目录
     
@@ -359,6 +466,7 @@ def parse_toc_from_text(text_content: str) -> tuple[List[TOCEntry], Dict[str, An
     
     Args:
         text_content: 文本内容
+        parse_metadata: 是否解析头部元数据（为 False 时返回的元数据字典为空）
         
     Returns:
         tuple: (目录条目列表, 元数据字典)
@@ -370,12 +478,42 @@ def parse_toc_from_text(text_content: str) -> tuple[List[TOCEntry], Dict[str, An
         >>> with open('toc.txt', 'r') as f:
         ...     entries, metadata = parse_toc_from_text(f.read())
     """
-    import re
+    return parse_toc_from_lines(text_content.split('\n'), parse_metadata)
+
+
+def parse_toc_from_lines(
+    lines: Iterable[str],
+    parse_metadata: bool = True
+) -> tuple[List[TOCEntry], Dict[str, Any]]:
+    """
+    从文本行解析目录
+    
+    与 parse_toc_from_text 相同，但接受任意可迭代的文本行（行尾换行符可有可无），
+    可以直接传入文件对象逐行解析，无需先把整个文件读入内存。
     
-    lines = text_content.split('\n')
+    Args:
+        lines: 文本行
+        parse_metadata: 是否解析头部元数据（为 False 时返回的元数据字典为空）
+        
+    Returns:
+        tuple: (目录条目列表, 元数据字典)
+        
+    Raises:
+        ValueError: 如果文本格式不正确
+        
+    Examples:
+        >>> with open('toc.txt', 'r', encoding='utf-8') as f:
+        ...     entries, metadata = parse_toc_from_lines(f)
+    """
     entries = []
     metadata = {}
     
+    # 循环中频繁使用的可调用对象绑定为局部变量
+    toc_line_match = _TOC_LINE_RE.match
+    make_entry = TOCEntry
+    append_entry = entries.append
+    indent_levels = _INDENT_LEVELS
+    
     # 解析元数据
     in_metadata = False
     in_toc_content = False
@@ -383,9 +521,12 @@ def parse_toc_from_text(text_content: str) -> tuple[List[TOCEntry], Dict[str, An
     for line in lines:
         line_stripped = line.rstrip()
         
-        # 跳过标题行
-        if '=' * 10 in line or line.strip() == 'PDF 目录':
-            in_metadata = True
+        # 跳过标题行（先用 endswith 排除绝大多数行，避免每行都 strip 一次）
+        if '=' * 10 in line or (
+            line_stripped.endswith('PDF 目录') and line_stripped.lstrip() == 'PDF 目录'
+        ):
+            # 不需要元数据时不进入元数据状态，头部各行直接跳过
+            in_metadata = parse_metadata
             continue
         
         # 检测到分隔线，开始解析目录内容
@@ -402,26 +543,22 @@ def parse_toc_from_text(text_content: str) -> tuple[List[TOCEntry], Dict[str, An
             elif line.startswith('总条目数:'):
                 metadata['total_entries'] = int(line.split(':')[1].strip())
         
-        # 解析目录条目
-        if in_toc_content and line_stripped:
+        # 解析目录条目（不含 ... 的行不可能匹配，先用子串检查跳过正则）
+        if in_toc_content and '...' in line_stripped:
             # 匹配格式: "  标题 ... 页码 (PDF: 实际页码)"
             # 或者: "标题 ... 页码 (PDF: 实际页码)"
-            match = re.match(r'^(\s*)(.+?)\s+\.\.\.\s+(\d+)\s+\(PDF:\s+\d+\)', line_stripped)
+            match = toc_line_match(line_stripped)
             
             if match:
                 indent = match.group(1)
                 title = match.group(2).strip()
                 page = int(match.group(3))
                 
-                # 计算层级（每2个空格为1级）
-                level = len(indent) // 2 + 1
-                
-                # 确保层级在有效范围内
-                level = max(1, min(5, level))
+                # 计算层级（每2个空格为1级，超出范围的缩进归为第5级）
+                level = indent_levels.get(len(indent), 5)
                 
                 try:
-                    entry = TOCEntry(title=title, page=page, level=level)
-                    entries.append(entry)
+                    append_entry(make_entry(title=title, page=page, level=level))
                 except ValueError as e:
                     logger.warning(f"跳过无效条目: {line_stripped[:50]} - {e}")
     
@@ -462,12 +599,12 @@ def import_toc_from_text_file(
     if not text_path.exists():
         raise FileNotFoundError(f"文本文件不存在: {text_file}")
     
-    # 读取文件内容
-    with open(text_path, 'r', encoding='utf-8') as f:
-        content = f.read()
+    # 调用方已提供 PDF 路径和页码偏置时，无需解析文本中的元数据
+    needs_metadata = not pdf_path or page_offset is None
     
-    # 解析目录
-    entries, metadata = parse_toc_from_text(content)
+    # 逐行读取并解析目录
+    with open(text_path, 'r', encoding='utf-8', buffering=1 << 20) as f:
+        entries, metadata = parse_toc_from_lines(f, parse_metadata=needs_metadata)
     
     # 使用提供的参数或从文本中提取的元数据
     final_pdf_path = pdf_path or metadata.get('pdf_path')